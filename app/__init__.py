@@ -2,19 +2,82 @@ from flask import Flask
 from config import Config
 from flask_cors import CORS
 import logging
+import weakref
+import os
+
+# The most recently created app; forked children restart its worker state (see restart_worker_after_fork)
+_current_app = None
 
 def create_app(config_class=Config):
+    global _current_app
     app = Flask(__name__)
     app.config.from_object(config_class)
 
-    # Configure logging
-    logging.basicConfig(filename='app.log', level=logging.INFO,
-                        format='%(asctime)s - %(levelname)s - %(message)s')
+    # Log through the background writer, so request threads never wait on the log file
+    from app.services.logging_config import setup_logging
+    setup_logging()
 
     # Enable CORS for all origins (for development purposes)
     CORS(app, resources={r"/api/*": {"origins": "*"}})
 
+    # Load the DILI reference data once at startup instead of on the first request. A pre-fork
+    # server that loads the app before forking (gunicorn --preload) then shares the mapped
+    # reference snapshot with all workers
+    from app.services.reference_store import get_reference_store
+    try:
+        get_reference_store().get()
+    except Exception as e:
+        logging.error(f"Could not load DILI reference data at startup: {e}")
+
     from app.routes import bp as routes_bp
     app.register_blueprint(routes_bp, url_prefix='/api')
 
-    return app
\ No newline at end of file
+    start_worker(app)
+    _current_app = weakref.ref(app)
+
+    return app
+
+def start_worker(app):
+    """
+    Starts the per-process state of an app worker: the dispatcher with its worker pools, whose
+    admission limits are shared with the other workers of the node when Config.SHARED_ADMISSION is set,
+    and the hedging policy when Config.HEDGE_ENABLED is set.
+    """
+    from app.routes import process_request
+    from app.services.dispatcher import Dispatcher
+    from app.services.hedging import HedgePolicy
+    from app.services.shared_admission import SharedAdmission
+
+    admission = SharedAdmission(Config.WORKER_STATE_FILE) if Config.SHARED_ADMISSION else None
+    # Per-model worker pools; each request waits only on its own future
+    app.extensions['dispatcher'] = Dispatcher(process_request, admission=admission)
+    if Config.HEDGE_ENABLED:
+        app.extensions['hedge_policy'] = HedgePolicy(
+            percentile=Config.HEDGE_PERCENTILE, min_delay=Config.HEDGE_MIN_DELAY,
+            budget_ratio=Config.HEDGE_BUDGET_RATIO, burst=Config.HEDGE_BUDGET_BURST,
+            min_samples=Config.HEDGE_MIN_SAMPLES)
+
+def restart_worker_after_fork(app):
+    """
+    Runs in every process forked from one that created the app. Threads do not survive fork and
+    SQLite and pooled API connections must not be shared with the parent, so the log writer,
+    extraction cache and API client are started afresh and the worker gets its own dispatcher.
+    The reference data is kept: it is read-only and its snapshot pages stay shared.
+    """
+    from app.services.logging_config import restart_logging_after_fork
+    from app.services.extraction_cache import reset_extraction_cache_after_fork
+    from app.services.llm_client import reset_client_after_fork
+
+    restart_logging_after_fork()
+    reset_extraction_cache_after_fork()
+    reset_client_after_fork()
+    start_worker(app)
+
+def _restart_current_app_after_fork():
+    app = _current_app() if _current_app is not None else None
+    if app is not None:
+        restart_worker_after_fork(app)
+
+# Registered once: fork hooks cannot be removed, so one per create_app call would pile up
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_current_app_after_fork)
@@ -1,92 +1,386 @@
-from flask import Blueprint, request, jsonify
-from app.services.medication_extractor import extract_medications_from_groq
+from flask import Blueprint, Response, current_app, request, jsonify
+from app.services.medication_extractor import extract_medications, stream_medications_from_groq
 from app.services.dili_connector import get_dili_risk_from_excel
+from app.services.dispatcher import SaturatedError
+from app.services.metrics import registry, BACKUP_FALLBACKS, HEDGES, STREAM_FIRST_RESULT
 from config import Config
+from concurrent.futures import TimeoutError as FutureTimeoutError, wait, FIRST_COMPLETED
+from collections import deque
+from functools import partial
+from queue import Queue, Empty
+import json
+import time
 import logging
-from queue import Queue, Empty, Full
 import threading
 
 bp = Blueprint('routes', __name__)
 
-# In-memory queue for API requests
-api_queue = Queue(maxsize=10)  # Max 10 items in the queue
-backup_queue = Queue(maxsize=10)
+def process_request(user_input, model, mode=None):
+    """
+    Extracts medications from one request and attaches their DILI risk information.
+    Runs on a dispatcher worker thread.
+    """
+    medication_list = extract_medications(user_input, model=model, mode=mode)
+    return attach_dili_risk(medication_list)
 
-def process_queue(queue, model):
+def process_hedged_request(user_input, model, mode=None):
     """
-    Worker function to process requests from the queue.
+    Like process_request, but returns None instead of an empty list when the extraction failed,
+    so a hedged request can wait for the other model's result instead.
     """
-    while True:
-        try:
-            item = queue.get(timeout=600)  # Get item from queue with a timeout
-            if item is None:  # Use None as a signal to stop the worker
-                break
-            user_input, result_container = item  # Remove model from here
+    medication_list = extract_medications(user_input, model=model, mode=mode)
+    return None if medication_list is None else attach_dili_risk(medication_list)
+
+def stream_request(user_input, model, results, cancelled, mode=None):
+    """
+    Extracts medications from one request of the streaming endpoint. Runs on a dispatcher worker
+    thread: in 'llm' mode each medication is looked up and put on `results` as soon as the model
+    has generated it, so the DILI lookups overlap the rest of the generation. Puts
+    ('medication', medication) items, then ('done', whether the extraction completed), and stops
+    early once `cancelled` is set.
+    """
+    complete = False
+    try:
+        if (mode or Config.EXTRACTION_MODE) == 'llm':
+            medications = stream_medications_from_groq(user_input, model)
             try:
-                medication_list = extract_medications_from_groq(user_input, model=model)
-                if medication_list:
-                    dili_risk_data = get_dili_risk_from_excel(medication_list)
-                    for medication in medication_list:
-                        drug_name = medication['normalized_name']
-                        for risk_entry in dili_risk_data:
-                            if risk_entry['Drug'] == drug_name:
-                                medication.update(risk_entry)
-                                break  # Stop searching after finding the first match
-                    result_container['result'] = medication_list
-                else:
-                    result_container['result'] = []
-            except Exception as e:
-                logging.error(f"Error processing medication extraction: {e}", exc_info=True)
-                result_container['error'] = str(e)
+                while not cancelled.is_set():
+                    try:
+                        medication = next(medications)
+                    except StopIteration as stop:
+                        complete = stop.value is not None
+                        break
+                    results.put(('medication', attach_dili_risk([medication])[0]))
             finally:
-                queue.task_done()
-        except Empty:
-            continue
+                medications.close()  # Closes the API stream when the client went away
+        else:
+            medication_list = extract_medications(user_input, model=model, mode=mode)
+            for medication in attach_dili_risk(medication_list):
+                results.put(('medication', medication))
+            complete = medication_list is not None
+    finally:
+        results.put(('done', complete))
 
-# Start the background thread to process the queue
-queue_thread = threading.Thread(target=process_queue, args=(api_queue, Config.MODEL), daemon=True)
-queue_thread.start()
+def attach_dili_risk(medication_list):
+    """Adds the DILI risk fields to each extracted medication."""
+    if not medication_list:
+        return []
+    dili_risk_data = get_dili_risk_from_excel(medication_list)
+    # The lookup returns one entry per medication, in order; its 'Drug' is the reference name,
+    # which differs from normalized_name for fuzzy and alias matches
+    for medication, risk_entry in zip(medication_list, dili_risk_data):
+        medication.update(risk_entry)
+    return medication_list
 
-# Start the background thread to process the backup queue
-backup_queue_thread = threading.Thread(target=process_queue, args=(backup_queue, Config.BACKUP_MODEL), daemon=True)
-backup_queue_thread.start()
+def get_dispatcher():
+    """Returns the dispatcher of this worker process, started by create_app (see app.start_worker)."""
+    return current_app.extensions['dispatcher']
+
+def get_hedge_policy():
+    """Returns the hedging policy of this worker process, or None if hedging is disabled."""
+    return current_app.extensions.get('hedge_policy')
 
 @bp.route('/process_medications', methods=['POST'])
 def process_medications():
     data = request.get_json()
     user_input = data.get('user_input')
     model = data.get('model', Config.MODEL)
+    mode = data.get('extraction_mode', Config.EXTRACTION_MODE)
 
-    logging.info(f"Received request - User input: {user_input}, Model: {model}")
+    logging.info("Received request - User input: %s, Model: %s", user_input, model, extra={'sample': 'user_input'})
 
     if not user_input or user_input.strip() == "":
         return jsonify({'data': []}), 200  # Return empty list for empty input
+    if mode not in ('llm', 'local', 'hybrid'):
+        return jsonify({'error': f'Extraction mode {mode} is not supported'}), 400
 
-    result_container = {}
+    # Hedging pays off for requests that wait on the primary model's API
+    policy = get_hedge_policy() if model == Config.MODEL and mode != 'local' else None
+    handler = partial(process_hedged_request if policy else process_request, mode=mode)
+    dispatcher = get_dispatcher()
     try:
-        if model == Config.MODEL:
-            api_queue.put((user_input, result_container), block=False)
-            api_queue.join()  # Wait for the primary task to be processed
-        elif model == Config.BACKUP_MODEL:
-            backup_queue.put((user_input, result_container), block=False)
-            backup_queue.join()  # Wait for the backup task to be processed
-        else:
-            return jsonify({'error': f'Model {model} is not supported'}), 400
-        if 'result' in result_container:
-            return jsonify({'message': 'Medications processed successfully', 'data': result_container['result']}), 200
+        future, used_model = dispatcher.submit(user_input, model, handler=handler)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except SaturatedError as e:
+        return jsonify({'error': str(e)}), 503
+
+    try:
+        if policy and used_model == model:
+            result, used_model = wait_hedged(user_input, future, handler, dispatcher, policy)
+            result = result or []
         else:
-            return jsonify({'error': result_container.get('error', 'Failed to process medications')}), 500
+            result = future.result(timeout=Config.REQUEST_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()  # Frees the slot if the request has not started yet
+        logging.error("Request timed out after %ss (model: %s)", Config.REQUEST_TIMEOUT, used_model)
+        return jsonify({'error': 'Timed out processing medications'}), 504
+    except Exception as e:
+        logging.error("Error processing medication extraction: %s", e, exc_info=True)
+        return jsonify({'error': str(e) or 'Failed to process medications'}), 500
 
-    except Full:
-        logging.warning(f"Primary queue full, attempting to use backup model: {Config.BACKUP_MODEL}")
-        try:
-            backup_queue.put((user_input, Config.BACKUP_MODEL, result_container), block=False)
-            backup_queue.join()
+    if used_model != model:
+        return jsonify({'message': 'Medications processed successfully with backup model', 'data': result}), 200
+    return jsonify({'message': 'Medications processed successfully', 'data': result}), 200
 
-            if 'result' in result_container:
-                return jsonify({'message': 'Medications processed successfully with backup model', 'data': result_container['result']}), 200
+def wait_hedged(user_input, future, handler, dispatcher, policy):
+    """
+    Waits for a request admitted to the primary model. If it is still running after the policy's
+    hedge delay and the hedge budget allows, the input is also sent to the backup model, and the
+    first valid result of the two wins. The other request is cancelled if it has not started yet;
+    otherwise it finishes in the background and only fills the extraction cache.
+
+    Returns:
+        tuple: (result, model that produced it); the result is None if neither request could
+               extract the input.
+
+    Raises:
+        concurrent.futures.TimeoutError: If there was no valid result within Config.REQUEST_TIMEOUT.
+        Exception: The error of the last failed request, if there was no valid result.
+    """
+    started = time.monotonic()
+    deadline = started + Config.REQUEST_TIMEOUT
+    policy.admit()
+
+    def record_latency(done):
+        if not done.cancelled():
+            policy.record(time.monotonic() - started)
+    future.add_done_callback(record_latency)
+
+    running = {future: Config.MODEL}
+    delay = policy.delay()
+    if not wait([future], timeout=min(delay, Config.REQUEST_TIMEOUT)).done:
+        if not policy.try_hedge():
+            HEDGES.inc(outcome='budget_exhausted')
+        else:
+            try:
+                hedge, _ = dispatcher.submit(user_input, Config.BACKUP_MODEL, handler=handler)
+            except SaturatedError:
+                HEDGES.inc(outcome='saturated')
             else:
-                return jsonify({'error': result_container.get('error', 'Failed to process medications with backup model')}), 500
+                logging.info("Primary model %s did not answer within %.2fs, hedging with %s",
+                             Config.MODEL, delay, Config.BACKUP_MODEL)
+                running[hedge] = Config.BACKUP_MODEL
+    hedged = len(running) > 1
+
+    error = None
+    try:
+        while running:
+            done, _ = wait(list(running), timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise FutureTimeoutError()
+            for finished in done:
+                used_model = running.pop(finished)
+                try:
+                    result = finished.result()
+                except Exception as e:
+                    logging.error("Error processing medication extraction with %s: %s", used_model, e, exc_info=True)
+                    error = e
+                    continue
+                if result is not None:
+                    if hedged:
+                        HEDGES.inc(outcome='primary_won' if used_model == Config.MODEL else 'backup_won')
+                    if used_model != Config.MODEL:
+                        BACKUP_FALLBACKS.inc(reason='hedged')
+                    return result, used_model
+        if hedged:
+            HEDGES.inc(outcome='both_failed')
+        if error is not None:
+            raise error
+        return None, Config.MODEL
+    finally:
+        for pending in running:
+            pending.cancel()  # The loser, if it has not started yet
+
+@bp.route('/process_medications/stream', methods=['POST'])
+def process_medications_stream():
+    """
+    Processes one input and streams its medications as NDJSON, each with its DILI risk as soon as
+    the model has generated it, then a summary line.
+    """
+    started = time.monotonic()
+    data = request.get_json()
+    user_input = data.get('user_input')
+    model = data.get('model', Config.MODEL)
+    mode = data.get('extraction_mode', Config.EXTRACTION_MODE)
+
+    logging.info("Received streaming request - User input: %s, Model: %s", user_input, model,
+                 extra={'sample': 'user_input'})
+
+    if not isinstance(user_input, str):
+        return jsonify({'error': 'user_input must be a string'}), 400
+    if mode not in ('llm', 'local', 'hybrid'):
+        return jsonify({'error': f'Extraction mode {mode} is not supported'}), 400
+    if user_input.strip() == "":
+        summary = {'medications': 0, 'model': model, 'complete': True, 'seconds': 0.0}
+        return Response(json.dumps({'summary': summary}) + '\n', mimetype='application/x-ndjson')
+
+    results = Queue()
+    cancelled = threading.Event()
+    handler = partial(stream_request, results=results, cancelled=cancelled, mode=mode)
+    try:
+        future, used_model = get_dispatcher().submit(user_input, model, handler=handler)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except SaturatedError as e:
+        return jsonify({'error': str(e)}), 503
+
+    return Response(stream_medication_lines(results, cancelled, future, used_model, started),
+                    mimetype='application/x-ndjson')
+
+def stream_medication_lines(results, cancelled, future, used_model, started):
+    """
+    Yields one NDJSON line per medication put on `results` by stream_request, followed by a
+    summary line; gives up after Config.REQUEST_TIMEOUT seconds.
+    """
+    deadline = started + Config.REQUEST_TIMEOUT
+    count = 0
+    first_result = None
+    complete = False
+    error = None
+    try:
+        while True:
+            try:
+                kind, value = results.get(timeout=max(0.0, deadline - time.monotonic()))
+            except Empty:
+                logging.error("Streaming request timed out after %ss (model: %s)", Config.REQUEST_TIMEOUT, used_model)
+                error = 'Timed out processing medications'
+                break
+            if kind == 'done':
+                complete = value
+                break
+            if first_result is None:
+                first_result = time.monotonic() - started
+                STREAM_FIRST_RESULT.observe(first_result)
+            yield json.dumps({'index': count, 'medication': value}) + '\n'
+            count += 1
+
+        if error is None:
+            try:
+                future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                error = 'Timed out processing medications'
+            except Exception as e:
+                logging.error("Error processing streaming medication extraction: %s", e, exc_info=True)
+                error = str(e) or 'Failed to process medications'
+
+        summary = {'medications': count, 'model': used_model, 'complete': complete and error is None,
+                   'seconds': round(time.monotonic() - started, 3),
+                   'first_result_seconds': None if first_result is None else round(first_result, 3)}
+        if error:
+            summary['error'] = error
+        yield json.dumps({'summary': summary}) + '\n'
+    finally:
+        # The client went away or the request timed out: stop the extraction
+        cancelled.set()
+        future.cancel()
+
+@bp.route('/process_medications/batch', methods=['POST'])
+def process_medications_batch():
+    """
+    Processes many inputs in one request and streams the results as NDJSON: one line per input
+    as soon as it is done (in completion order, tagged with its index), then a summary line.
+    """
+    data = request.get_json()
+    user_inputs = data.get('user_inputs')
+    model = data.get('model', Config.MODEL)
+    mode = data.get('extraction_mode', Config.EXTRACTION_MODE)
+
+    if not isinstance(user_inputs, list):
+        return jsonify({'error': 'user_inputs must be a list of strings'}), 400
+    if len(user_inputs) > Config.BATCH_REQUEST_MAX_ITEMS:
+        return jsonify({'error': f'At most {Config.BATCH_REQUEST_MAX_ITEMS} inputs per batch request'}), 400
+    if model not in (Config.MODEL, Config.BACKUP_MODEL):
+        return jsonify({'error': f'Model {model} is not supported'}), 400
+    if mode not in ('llm', 'local', 'hybrid'):
+        return jsonify({'error': f'Extraction mode {mode} is not supported'}), 400
+
+    logging.info("Received batch request - %d inputs, Model: %s", len(user_inputs), model)
+    lines = stream_batch_results(user_inputs, model, partial(process_request, mode=mode), get_dispatcher())
+    return Response(lines, mimetype='application/x-ndjson')
+
+def stream_batch_results(user_inputs, model, handler, dispatcher):
+    """
+    Runs every input through the dispatcher and yields one NDJSON line per input as it finishes,
+    followed by a summary line.
+
+    At most Config.BATCH_REQUEST_MAX_IN_FLIGHT inputs are admitted at a time, so a batch leaves
+    room in the pool for single requests, and inputs never spill over to the backup pool just
+    because the requested model's pool is busy. When the pool is saturated, the remaining inputs
+    wait for this batch's own requests to finish (or, with none running, for
+    Config.REQUEST_TIMEOUT seconds at most) instead of failing the whole batch.
+    """
+    started = time.monotonic()
+    counts = {'succeeded': 0, 'failed': 0}
+    pending = deque()
+    running = {}  # future -> (index, model used, admitted at)
+
+    def line(index, result=None, error=None, used_model=None):
+        counts['failed' if error else 'succeeded'] += 1
+        if error:
+            return json.dumps({'index': index, 'status': 'error', 'error': error}) + '\n'
+        return json.dumps({'index': index, 'status': 'ok', 'model': used_model, 'data': result}) + '\n'
+
+    for index, user_input in enumerate(user_inputs):
+        if not isinstance(user_input, str):
+            yield line(index, error='user_input must be a string')
+        elif user_input.strip() == "":
+            yield line(index, result=[], used_model=model)  # Empty list for empty input
+        else:
+            pending.append(index)
+
+    blocked_since = None
+    saturated_error = None
+    try:
+        while pending or running:
+            while pending and len(running) < Config.BATCH_REQUEST_MAX_IN_FLIGHT:
+                try:
+                    future, used_model = dispatcher.submit(user_inputs[pending[0]], model, handler=handler,
+                                                           fallback=False)
+                except SaturatedError as e:
+                    saturated_error = str(e)
+                    break
+                running[future] = (pending.popleft(), used_model, time.monotonic())
+                blocked_since = None
+
+            if not running:
+                # Saturated by other requests: retry admission until the timeout runs out
+                blocked_since = blocked_since or time.monotonic()
+                if time.monotonic() - blocked_since >= Config.REQUEST_TIMEOUT:
+                    while pending:
+                        yield line(pending.popleft(), error=saturated_error)
+                    break
+                time.sleep(0.05)
+                continue
+
+            oldest = min(admitted_at for _, _, admitted_at in running.values())
+            done, _ = wait(list(running), timeout=max(0.0, oldest + Config.REQUEST_TIMEOUT - time.monotonic()),
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                index, used_model, _ = running.pop(future)
+                try:
+                    yield line(index, result=future.result(), used_model=used_model)
+                except Exception as e:
+                    logging.error("Error processing batch item %s: %s", index, e, exc_info=True)
+                    yield line(index, error=str(e) or 'Failed to process medications')
+
+            now = time.monotonic()
+            for future, (index, used_model, admitted_at) in list(running.items()):
+                if now - admitted_at >= Config.REQUEST_TIMEOUT:
+                    future.cancel()  # Frees the slot if the request has not started yet
+                    del running[future]
+                    logging.error("Batch item %s timed out after %ss (model: %s)", index, Config.REQUEST_TIMEOUT, used_model)
+                    yield line(index, error='Timed out processing medications')
+
+        yield json.dumps({'summary': {'total': len(user_inputs), 'succeeded': counts['succeeded'],
+                                      'failed': counts['failed'],
+                                      'seconds': round(time.monotonic() - started, 3)}}) + '\n'
+    finally:
+        # The client went away (or the stream ended early): drop work that has not started
+        for future in running:
+            future.cancel()
 
-        except Full:
-            return jsonify({'error': 'Both primary and backup queues are full, please try again later'}), 503
\ No newline at end of file
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Exposes the service metrics in the Prometheus text format."""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
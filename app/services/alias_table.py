@@ -0,0 +1,136 @@
+import re
+import unicodedata
+
+from app.services.utils import strip_salt_suffixes
+
+# Preference when sources disagree about an alias: lower wins (kind first, then source)
+KIND_PRIORITY = {'generic': 0, 'salt_stripped': 1, 'brand': 2}
+SOURCE_PRIORITY = {'combined': 0, 'dilirank': 1, 'livertox': 2}
+
+# LiverTox "Brand Name" values that are not brand names
+NON_BRANDS = frozenset(['', 'generic', 'generics', 'group name', 'multiple', 'n/a', 'none', 'various'])
+
+# Brand lists are separated by commas/semicolons, or by slashes between words ("Procrit/ Epogen"),
+# but not inside names like "Fulvicin P/G" or "Azor 10/20"
+BRAND_SEPARATORS = re.compile(r"[,;]|\s*/\s*(?=[a-z]{3})")
+
+
+def normalize_alias(name):
+    """
+    Normalizes a drug name for exact lookup: unicode (NFKC) and case folding, punctuation
+    such as hyphens and parentheses turned into spaces, whitespace collapsed.
+    """
+    if not isinstance(name, str):
+        return ''
+    name = unicodedata.normalize('NFKC', name).lower()
+    name = re.sub(r"[-_,;:()\[\]'\"]", ' ', name)
+    return re.sub(r"\s+", ' ', name).strip()
+
+
+class AliasTable:
+    """
+    Exact-match table from drug aliases (generic names, salt-stripped names, brand names and
+    spelling variants) to rows of the combined reference table, with the provenance of each alias.
+    """
+
+    def __init__(self, aliases):
+        """
+        Args:
+            aliases (dict): Normalized alias -> (row, source, kind). `source` names the workbook(s)
+                            the alias came from ('combined', 'dilirank', 'livertox', joined by '+'),
+                            `kind` is 'generic', 'salt_stripped' or 'brand'.
+        """
+        self._aliases = aliases
+
+    def __len__(self):
+        return len(self._aliases)
+
+    def items(self):
+        return self._aliases.items()
+
+    def lookup(self, name):
+        """
+        Looks up a drug name, then the name without its salt suffixes.
+
+        Returns:
+            tuple: (row, source, kind), or None if neither form is a known alias.
+        """
+        normalized = normalize_alias(name)
+        for candidate in dict.fromkeys([normalized, strip_salt_suffixes(normalized)]):
+            entry = self._aliases.get(candidate)
+            if entry is not None:
+                return entry
+        return None
+
+
+def split_brand_names(value):
+    """Splits a LiverTox "Brand Name" cell into brand names, dropping placeholders like 'Generic'."""
+    if not isinstance(value, str):
+        return []
+    brands = []
+    for brand in BRAND_SEPARATORS.split(unicodedata.normalize('NFKC', value).lower()):
+        brand = normalize_alias(brand)
+        if brand not in NON_BRANDS:
+            brands.append(brand)
+    return brands
+
+
+def build_alias_table(combined_names, dilirank_records=(), livertox_records=()):
+    """
+    Merges the DILIrank and LiverTox workbooks into an alias table over the combined drugs.
+
+    Every alias points at the combined row whose name it belongs to: the combined names
+    themselves, DILIrank "Compound Name"s and LiverTox "Ingredient"s (each also without salt
+    suffixes), and the LiverTox "Brand Name"s of each ingredient. Entries of DILIrank/LiverTox
+    that have no combined row are skipped. When an alias points at different rows, the more
+    specific kind wins (generic, then salt-stripped, then brand); if that still leaves
+    several rows, the alias is ambiguous and dropped.
+
+    Args:
+        combined_names (list): Combined drug names, in row order.
+        dilirank_records (iterable): DILIrank rows as mappings with a 'Compound Name' key.
+        livertox_records (iterable): LiverTox rows as mappings with 'Ingredient' and 'Brand Name' keys.
+
+    Returns:
+        AliasTable: The merged aliases.
+    """
+    rows_by_name = {}
+    for row, name in enumerate(combined_names):
+        rows_by_name.setdefault(normalize_alias(name), row)
+
+    candidates = {}
+
+    def add(alias, row, source, kind):
+        if alias:
+            candidates.setdefault(alias, []).append(((KIND_PRIORITY[kind], SOURCE_PRIORITY[source]), row, source, kind))
+
+    def add_generic(name, row, source):
+        add(name, row, source, 'generic')
+        stripped = strip_salt_suffixes(name)
+        if stripped != name:
+            add(stripped, row, source, 'salt_stripped')
+
+    for name, row in rows_by_name.items():
+        add_generic(name, row, 'combined')
+    for record in dilirank_records:
+        name = normalize_alias(record.get('Compound Name'))
+        if name in rows_by_name:
+            add_generic(name, rows_by_name[name], 'dilirank')
+    for record in livertox_records:
+        name = normalize_alias(record.get('Ingredient'))
+        if name not in rows_by_name:
+            continue
+        add_generic(name, rows_by_name[name], 'livertox')
+        for brand in split_brand_names(record.get('Brand Name')):
+            add(brand, rows_by_name[name], 'livertox', 'brand')
+
+    aliases = {}
+    for alias, entries in candidates.items():
+        best_kind = min(priority[0] for priority, _, _, _ in entries)
+        best = [entry for entry in entries if entry[0][0] == best_kind]
+        if len({row for _, row, _, _ in best}) > 1:
+            continue  # e.g. a combination product's brand listed under each of its ingredients
+        best.sort()
+        sources = '+'.join(dict.fromkeys(source for _, _, source, _ in best))
+        aliases[alias] = (best[0][1], sources, best[0][3])
+    return AliasTable(aliases)
@@ -1,7 +1,7 @@
-import pandas as pd
 from config import Config
 import logging
-from fuzzywuzzy import fuzz
+from app.services.reference_store import get_reference_store
+from app.services.metrics import DILI_MATCH, UNMATCHED_DRUGS
 
 import sys
 import os
@@ -12,10 +12,6 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..
 # Add the project root to the Python path
 sys.path.insert(0, project_root)
 
-# Configure logging
-logging.basicConfig(filename='app.log', level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
-
 def get_dili_risk_from_excel(medication_list):
     """
     Retrieves DILI risk information for a list of medications from the Combined.xlsx file.
@@ -28,47 +24,51 @@ def get_dili_risk_from_excel(medication_list):
         list: A list of dictionaries, where each dictionary contains DILI risk information
               for a medication.
     """
-    try:
-        # Load combined data from the specified sheet
-        logging.info(f"Loading combined DILI data from: {Config.COMBINED_FILE}, Sheet: 'Sheet1'")
-        combined_df = pd.read_excel(Config.COMBINED_FILE, sheet_name='Sheet1')  # Specify sheet name
-        logging.info(f"Successfully loaded combined DILI data.")
+    return [dili_info for dili_info, _, _ in match_dili_risk(medication_list)]
+
+def match_dili_risk(medication_list):
+    """
+    Like get_dili_risk_from_excel, but also reports how each medication was matched.
 
-        # Rename columns for consistency
-        combined_df.rename(columns={
-            'Drug Name': 'Drug',  # Keep this if your column is still named 'Drug Name'
-            'vDILIConcern': 'DILI_Likelihood',
-            'Livertox Score': 'LiverTox_LikelihoodScore'  # Match the exact column name
-        }, inplace=True)
+    Returns:
+        list: One (DILI risk information, matched reference drug, match score) tuple per medication.
+              The matched drug and score are None if there is no match. Empty if the lookup failed.
+    """
+    try:
+        # Reference data is loaded once per process and reloaded only when the file changes
+        reference_table = get_reference_store().get()
 
         dili_risk_data = []
 
-        for medication in medication_list:
-            drug_name = medication['normalized_name'].lower()
+        drug_names = [medication['normalized_name'].lower() for medication in medication_list]
 
-            # Find the best match using fuzzy matching
-            best_match = None
-            best_score = 0
-            for index, row in combined_df.iterrows():
-                score = fuzz.ratio(drug_name, str(row['Drug']).lower())  # Convert to string before lowercasing
-                #logging.info(f"  Comparing to: {row['Drug']}, Score: {score}")
-                if score > best_score:
-                    best_score = score
-                    best_match = row
+        # Resolve every name with an alias lookup, falling back to the indexed fuzzy matcher
+        with DILI_MATCH.time():
+            matches = reference_table.match_many(drug_names)
 
-            # Set a threshold for matching (e.g., 85%)
-            if best_match is not None and best_score >= 85:
-                combined_info = best_match.to_dict()
-                logging.info(f"Found match for {drug_name}: {combined_info['Drug']} (score: {best_score})")
+        for drug_name, (best_match, best_score, alias) in zip(drug_names, matches):
+            # The matcher only returns a match at or above Config.MATCH_THRESHOLD (85 by default)
+            matched_drug = None
+            if best_match is not None:
+                combined_info = reference_table.record(best_match)
+                matched_drug = combined_info['Drug']
+                if alias is not None:
+                    logging.info("Found alias for %s: %s (%s, from %s)", drug_name, combined_info['Drug'], alias[2], alias[1],
+                                 extra={'sample': 'drug_match'})
+                else:
+                    logging.info("Found match for %s: %s (score: %s)", drug_name, combined_info['Drug'], best_score,
+                                 extra={'sample': 'drug_match'})
             else:
                 combined_info = {
                     'Drug': drug_name,
                     'DILI_Likelihood': 'Unknown - no match',
                     'LiverTox_LikelihoodScore': 'Unknown - no match'
                 }
-                logging.warning(f"No close match found for drug: {drug_name} (best score: {best_score if best_match is not None else 0} - compared to: {row['Drug'].lower() if best_match is not None else ''})")
+                UNMATCHED_DRUGS.inc()
+                logging.warning("No close match found for drug: %s (nothing scored %s or more)", drug_name,
+                                Config.MATCH_THRESHOLD, extra={'sample': 'unmatched_drug'})
 
-            dili_risk_data.append(combined_info)
+            dili_risk_data.append((combined_info, matched_drug, best_score))
 
         return dili_risk_data
 
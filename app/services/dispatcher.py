@@ -0,0 +1,152 @@
+import time
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from app.services.metrics import QUEUE_WAIT, QUEUE_DEPTH, IN_FLIGHT, BACKUP_FALLBACKS
+
+
+class SaturatedError(Exception):
+    """Raised when no model pool has room for another request."""
+
+
+class ModelPool:
+    """
+    A bounded worker pool for one model.
+
+    At most `max_in_flight` requests may be queued or running at once; beyond that,
+    `try_submit` refuses the request instead of letting the backlog (and the latency of
+    everything behind it) grow. With a SharedAdmission, the limit also holds across all
+    worker processes using it.
+    """
+
+    def __init__(self, model, handler, workers, max_in_flight, name=None, admission=None):
+        self.model = model
+        self.name = name or model
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self._handler = handler
+        self._admission = admission
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dispatcher')
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.running = 0
+        QUEUE_DEPTH.set_function(lambda: self.queued, queue=self.name)
+        IN_FLIGHT.set_function(lambda: self.in_flight, queue=self.name)
+
+    @property
+    def queued(self):
+        """Requests admitted but not yet picked up by a worker."""
+        return self.in_flight - self.running
+
+    def try_submit(self, user_input, handler=None):
+        """
+        Schedules `handler(user_input, model)` on the pool (default: the pool's handler).
+
+        Returns:
+            Future: The future of the request, or None if the pool is saturated.
+        """
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                return None
+            self.in_flight += 1
+        slot = None
+        if self._admission is not None:
+            try:
+                slot = self._admission.try_acquire(self.name, self.max_in_flight)
+            except sqlite3.Error as e:
+                logging.error(f"Shared admission failed, admitting on the process limit only: {e}")
+            else:
+                if slot is None:  # Full across the workers of the node
+                    self._release(None)
+                    return None
+        try:
+            future = self._executor.submit(self._run, user_input, handler or self._handler, time.perf_counter())
+        except RuntimeError:  # The pool is shutting down
+            self._release(slot)
+            return None
+        future.add_done_callback(lambda _: self._release(slot))
+        return future
+
+    def _run(self, user_input, handler, submitted_at):
+        QUEUE_WAIT.observe(time.perf_counter() - submitted_at, queue=self.name)
+        with self._lock:
+            self.running += 1
+        try:
+            return handler(user_input, self.model)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def _release(self, slot):
+        with self._lock:
+            self.in_flight -= 1
+        if slot is not None:
+            try:
+                self._admission.release(slot)
+            except sqlite3.Error as e:
+                logging.error(f"Could not release shared admission slot {slot}: {e}")
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class Dispatcher:
+    """
+    Routes extraction requests to per-model worker pools, each request getting its own future.
+
+    Requests for the primary model fail over to the backup model's pool when the primary
+    pool is saturated.
+    """
+
+    def __init__(self, handler, workers=None, max_in_flight=None, admission=None):
+        """
+        Args:
+            handler (callable): Called as handler(user_input, model) on a worker thread.
+            workers (int): Worker threads per model (default: Config.DISPATCHER_WORKERS).
+            max_in_flight (int): Admitted requests per model (default: Config.DISPATCHER_MAX_IN_FLIGHT).
+            admission (SharedAdmission): Optional node-wide admission slots shared with other
+                                         worker processes, so max_in_flight applies to all of them.
+        """
+        workers = workers or Config.DISPATCHER_WORKERS
+        max_in_flight = max_in_flight or Config.DISPATCHER_MAX_IN_FLIGHT
+        self.primary = ModelPool(Config.MODEL, handler, workers, max_in_flight, name='api_queue', admission=admission)
+        self.backup = ModelPool(Config.BACKUP_MODEL, handler, workers, max_in_flight, name='backup_queue',
+                                admission=admission)
+
+    def submit(self, user_input, model, handler=None, fallback=True):
+        """
+        Admits a request for `model`. `handler` overrides the dispatcher's handler for this
+        request, e.g. to stream its results. With fallback=False, a request for the primary model
+        is refused instead of going to the backup pool when the primary pool is saturated.
+
+        Returns:
+            tuple: (future, model actually used).
+
+        Raises:
+            ValueError: If the model is not supported.
+            SaturatedError: If neither the requested pool nor its fallback has room.
+        """
+        if model == Config.MODEL:
+            pools = [self.primary, self.backup] if fallback else [self.primary]
+        elif model == Config.BACKUP_MODEL:
+            pools = [self.backup]
+        else:
+            raise ValueError(f'Model {model} is not supported')
+
+        for pool in pools:
+            future = pool.try_submit(user_input, handler)
+            if future is not None:
+                if pool.model != model:
+                    BACKUP_FALLBACKS.inc(reason='saturated')
+                return future, pool.model
+            logging.warning("Model pool for %s is saturated (%d in flight)", pool.model, pool.in_flight)
+        if len(pools) == 1:
+            raise SaturatedError(f'The queue for model {model} is full, please try again later')
+        raise SaturatedError('Both primary and backup queues are full, please try again later')
+
+    def shutdown(self, wait=True):
+        self.primary.shutdown(wait)
+        self.backup.shutdown(wait)
@@ -0,0 +1,121 @@
+from collections import Counter, defaultdict
+
+from fuzzywuzzy import fuzz
+from config import Config
+
+
+def _bigrams(name):
+    """Returns the multiset of character bigrams in a name."""
+    return Counter(name[i:i + 2] for i in range(len(name) - 1))
+
+
+class DrugMatcher:
+    """
+    Indexed fuzzy matcher over a fixed list of reference drug names.
+
+    Returns the same best match as scoring every reference name with `fuzz.ratio` and keeping
+    the first highest score, but only scores a shortlist. A name can only reach the threshold
+    if its length is close enough and it shares enough character bigrams with the query
+    (q-gram lemma), so every other name is skipped without being scored.
+    """
+
+    def __init__(self, names, threshold=None, postings=None):
+        """
+        Args:
+            names (list): Lowercased reference names, in row order.
+            threshold (int): Minimum fuzz.ratio score for a match (default: Config.MATCH_THRESHOLD).
+            postings (dict): Prebuilt bigram index, as found in `postings` of a matcher built over
+                             the same names (e.g. loaded from the reference index snapshot).
+        """
+        self.names = tuple(names)
+        self.threshold = Config.MATCH_THRESHOLD if threshold is None else threshold
+        self._exact = {}
+        self._by_length = defaultdict(list)
+        for index, name in enumerate(self.names):
+            self._exact.setdefault(name, index)
+            self._by_length[len(name)].append(index)
+        self._max_length = max(self._by_length, default=0)
+        self.postings = self._build_postings(self.names) if postings is None else postings
+
+    @staticmethod
+    def _build_postings(names):
+        """Maps each bigram to parallel sequences of (row indices, occurrence counts)."""
+        postings = {}
+        for index, name in enumerate(names):
+            for gram, count in _bigrams(name).items():
+                indices, counts = postings.setdefault(gram, ([], []))
+                indices.append(index)
+                counts.append(count)
+        return postings
+
+    def match(self, name):
+        """
+        Finds the best reference match for a single lowercased name.
+
+        Returns:
+            tuple: (index, score). `index` is the row of the best match and `score` its score;
+                   both are None if no name scored at least the threshold. (Only the shortlist
+                   is scored, so the best score below the threshold is not known.)
+        """
+        if not name:
+            return None, None
+        index = self._exact.get(name)
+        # fuzz.ratio rounds, so for very long strings a near-identical earlier row could also
+        # score 100; below 200 combined characters only an identical name can.
+        if index is not None and len(name) + self._max_length < 200:
+            return index, 100
+
+        best_match = None
+        best_score = 0
+        for index in self._candidates(name):
+            score = fuzz.ratio(name, self.names[index])
+            if score > best_score:
+                best_score = score
+                best_match = index
+        if best_score < self.threshold:
+            return None, None
+        return best_match, best_score
+
+    def match_many(self, names):
+        """
+        Matches a list of lowercased names. This is a loop of `match` calls over the distinct
+        names (fuzz.ratio scores one pair at a time), not a vectorized pass.
+
+        Returns:
+            list: One (index, score) tuple per input name, in input order.
+        """
+        resolved = {}
+        for name in names:
+            if name not in resolved:
+                resolved[name] = self.match(name)
+        return [resolved[name] for name in names]
+
+    def _candidates(self, name):
+        """Returns, in row order, the indices of every name that could reach the threshold."""
+        query_length = len(name)
+        # Scores are rounded, so anything with a raw ratio >= (threshold - 0.5) / 100 may match.
+        # The bounds below are kept in integers (ratio scaled by 200) to avoid float rounding.
+        scaled_threshold = 2 * self.threshold - 1
+
+        shared = defaultdict(int)
+        for gram, count in _bigrams(name).items():
+            indices, counts = self.postings.get(gram, ((), ()))
+            for index, reference_count in zip(indices, counts):
+                shared[index] += min(count, reference_count)
+
+        candidates = []
+        for length, indices in self._by_length.items():
+            total = query_length + length
+            # ratio = 2 * matches / total and matches <= the shorter length
+            if 400 * min(query_length, length) < scaled_threshold * total:
+                continue
+            # Edit distance is at most the indel distance, total - 2 * matches, and each edit
+            # destroys at most two bigrams.
+            max_distance = (200 - scaled_threshold) * total // 200
+            required = max(query_length, length) - 1 - 2 * max_distance
+            if required <= 0:
+                candidates.extend(indices)
+            else:
+                candidates.extend(index for index in indices if shared.get(index, 0) >= required)
+        candidates.sort()
+        return candidates
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from fuzzywuzzy import fuzz
+
+from app.services.utils import clean_and_split_drug_names
+
+
+def ratio_scores(left, right):
+    """
+    Scores the pairs (left[i], right[i]) with fuzz.ratio, the scorer evaluate_extraction uses, so
+    the metrics match the ones process_nhanes.py reports. Without python-Levenshtein fuzz.ratio
+    is not symmetric, so the order of the two sides matters.
+
+    Returns:
+        ndarray: Integer scores (0-100); 0 when either string is empty.
+    """
+    return np.array([fuzz.ratio(str(a), str(b)) for a, b in zip(left, right)], dtype=np.int64)
+
+
+def build_evaluation_tables(input_counts, extractions):
+    """
+    Lays out the extracted and expected drug names of every distinct input, with the best
+    similarity each of them reaches against the other side.
+
+    Like evaluate_extraction, names are compared as lowercase sets per input, and inputs without
+    extracted medications are left out.
+
+    Args:
+        input_counts (Series): Distinct drug_concat string -> number of rows sharing it.
+        extractions (dict): drug_concat string -> extracted medication list (or None).
+
+    Returns:
+        tuple: (extracted, expected) DataFrames with columns input, name, rows and best_score.
+    """
+    extracted_rows = []
+    expected_rows = []
+    for input_id, (drug_concat, row_count) in enumerate(input_counts.items()):
+        medication_info = extractions.get(drug_concat)
+        if not medication_info:
+            continue
+        for name in {medication['normalized_name'].lower() for medication in medication_info}:
+            extracted_rows.append((input_id, name, row_count))
+        for name in {name.lower() for name in clean_and_split_drug_names(drug_concat)}:
+            expected_rows.append((input_id, name, row_count))
+
+    columns = ['input', 'name', 'rows']
+    extracted = pd.DataFrame(extracted_rows, columns=columns)
+    expected = pd.DataFrame(expected_rows, columns=columns)
+
+    # Every extracted x expected name pair of the same input, each distinct string pair scored once
+    pairs = extracted[['input', 'name']].merge(expected[['input', 'name']], on='input', suffixes=('_extracted', '_expected'))
+    distinct_pairs = pairs[['name_extracted', 'name_expected']].drop_duplicates()
+    # Scored in the same argument order as evaluate_extraction uses for each side
+    distinct_pairs['extracted_score'] = ratio_scores(distinct_pairs['name_extracted'].tolist(),
+                                                     distinct_pairs['name_expected'].tolist())
+    distinct_pairs['expected_score'] = ratio_scores(distinct_pairs['name_expected'].tolist(),
+                                                    distinct_pairs['name_extracted'].tolist())
+    pairs = pairs.merge(distinct_pairs, on=['name_extracted', 'name_expected'])
+
+    best_extracted = pairs.groupby(['input', 'name_extracted'])['extracted_score'].max().rename('best_score')
+    best_expected = pairs.groupby(['input', 'name_expected'])['expected_score'].max().rename('best_score')
+    extracted = extracted.merge(best_extracted, left_on=['input', 'name'], right_index=True, how='left')
+    expected = expected.merge(best_expected, left_on=['input', 'name'], right_index=True, how='left')
+    extracted['best_score'] = extracted['best_score'].fillna(0).astype(np.int64)
+    expected['best_score'] = expected['best_score'].fillna(0).astype(np.int64)
+    return extracted, expected
+
+
+def _scores(tp, fp, fn):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return precision, recall, f1
+
+
+def metrics_by_threshold(extracted, expected, thresholds):
+    """
+    Returns row-weighted TP/FP/FN, precision, recall and F1 for each match threshold, counted the
+    same way as evaluate_extraction: an extracted name is a true positive if some expected name
+    reaches the threshold (a false positive otherwise), an expected name no extracted name
+    reaches is a false negative.
+    """
+    thresholds = np.asarray(thresholds)
+    hits = extracted['best_score'].to_numpy()[:, None] >= thresholds
+    found = expected['best_score'].to_numpy()[:, None] >= thresholds
+    extracted_rows = extracted['rows'].to_numpy()[:, None]
+    expected_rows = expected['rows'].to_numpy()[:, None]
+    tp = (hits * extracted_rows).sum(axis=0)
+    fp = (~hits * extracted_rows).sum(axis=0)
+    fn = (~found * expected_rows).sum(axis=0)
+    precision, recall, f1 = _scores(tp, fp, fn)
+    return pd.DataFrame({'threshold': thresholds, 'tp': tp, 'fp': fp, 'fn': fn,
+                         'precision': precision, 'recall': recall, 'f1': f1})
+
+
+def metrics_by_drug(extracted, expected, threshold):
+    """
+    Returns row-weighted metrics per drug name at one threshold: how often it was expected and
+    found or missed (recall), and how often it was extracted with or without a matching expected
+    name (precision).
+    """
+    expected = expected.assign(found=expected['rows'] * (expected['best_score'] >= threshold))
+    extracted = extracted.assign(matched=extracted['rows'] * (extracted['best_score'] >= threshold))
+    by_expected = expected.groupby('name').agg(expected=('rows', 'sum'), found=('found', 'sum'))
+    by_extracted = extracted.groupby('name').agg(extracted=('rows', 'sum'), matched=('matched', 'sum'))
+    drugs = by_expected.join(by_extracted, how='outer').fillna(0).astype(np.int64)
+    drugs['missed'] = drugs['expected'] - drugs['found']
+    drugs['spurious'] = drugs['extracted'] - drugs['matched']
+    drugs['precision'], drugs['recall'], drugs['f1'] = _scores(drugs['matched'].to_numpy(), drugs['spurious'].to_numpy(),
+                                                               drugs['missed'].to_numpy())
+    return drugs.sort_values('expected', ascending=False)
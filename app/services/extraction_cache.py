@@ -0,0 +1,148 @@
+import os
+import re
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from config import Config
+from app.services.metrics import CACHE_HITS, CACHE_MISSES
+
+
+def canonicalize_input(text):
+    """Normalizes unicode forms and whitespace so trivially different inputs share a cache entry."""
+    return re.sub(r"\s+", " ", unicodedata.normalize('NFKC', text)).strip()
+
+
+def make_cache_key(text, model, prompt_version):
+    """Returns the cache key for an extraction of `text` with a given model and prompt version."""
+    payload = json.dumps([canonicalize_input(text), model, prompt_version])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ExtractionCache:
+    """
+    Two-tier cache of medication extraction results.
+
+    Results are kept in an in-process LRU and in a SQLite file, so they survive restarts and
+    are shared by every process using the same file. Entries older than `ttl` seconds are
+    treated as misses; each tier is trimmed to its maximum size, least recently used first.
+    Values are stored as JSON text, so every `get` returns a fresh copy the caller may modify.
+    """
+
+    def __init__(self, path, memory_size=None, max_entries=None, ttl=None):
+        self.path = path
+        self.memory_size = Config.EXTRACTION_CACHE_MEMORY_SIZE if memory_size is None else memory_size
+        self.max_entries = Config.EXTRACTION_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl = Config.EXTRACTION_CACHE_TTL if ttl is None else ttl
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts_since_trim = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS extractions_accessed_at ON extractions (accessed_at)")
+
+    def get(self, key):
+        """
+        Looks up a cached extraction.
+
+        Returns:
+            list: The cached medication list, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    CACHE_HITS.inc(tier='memory')
+                    return json.loads(value)
+                del self._memory[key]
+
+            row = self._db.execute("SELECT value, created_at FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM extractions WHERE key = ?", (key,))
+                self.misses += 1
+                CACHE_MISSES.inc()
+                return None
+            self._db.execute("UPDATE extractions SET accessed_at = ? WHERE key = ?", (now, key))
+            self._remember(key, row[1], row[0])
+            self.disk_hits += 1
+            CACHE_HITS.inc(tier='sqlite')
+            return json.loads(row[0])
+
+    def put(self, key, medication_list):
+        """Stores an extraction result in both tiers."""
+        now = time.time()
+        value = json.dumps(medication_list)
+        with self._lock:
+            self._remember(key, now, value)
+            self._db.execute("INSERT OR REPLACE INTO extractions (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                             (key, value, now, now))
+            self._puts_since_trim += 1
+            # Trimming scans the index, so only do it once every few hundred writes
+            if self._puts_since_trim >= 256:
+                self._puts_since_trim = 0
+                self._trim(now)
+
+    def stats(self):
+        """Returns the hit/miss counters."""
+        with self._lock:
+            return {'memory_hits': self.memory_hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'memory_entries': len(self._memory)}
+
+    def _remember(self, key, created_at, value):
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _trim(self, now):
+        self._db.execute("DELETE FROM extractions WHERE created_at <= ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM extractions WHERE key IN ("
+            "SELECT key FROM extractions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_inherited_caches = []
+
+
+def get_extraction_cache():
+    """Returns the process-wide ExtractionCache for Config.EXTRACTION_CACHE_FILE."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ExtractionCache(Config.EXTRACTION_CACHE_FILE)
+    return _cache
+
+
+def reset_extraction_cache_after_fork():
+    """
+    Makes a forked child open its own cache connection on first use. A SQLite connection must not
+    be used across fork; the inherited one is kept referenced rather than closed, because closing
+    it would drop the SQLite file locks held by this process's own connection.
+    """
+    global _cache
+    if _cache is not None:
+        _inherited_caches.append(_cache)
+    _cache = None
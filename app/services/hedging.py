@@ -0,0 +1,57 @@
+import math
+import threading
+from collections import deque
+
+from app.services.metrics import HEDGE_DELAY
+
+
+class HedgePolicy:
+    """
+    Decides when a slow primary-model request is also sent to the backup model.
+
+    The hedge delay is the `percentile` of the latencies of recent primary requests (from
+    admission to result, over the last `window` requests), but at least `min_delay`; until
+    `min_samples` latencies are known it is `min_delay`. So only the slowest requests are hedged.
+
+    Hedges are paid from a budget: every request adds `budget_ratio` of a hedge, up to `burst`
+    hedges, and each hedge spends one. At most about `budget_ratio` of the requests are hedged
+    in the long run, also when the primary model is slow for everyone.
+    """
+
+    def __init__(self, percentile=95, min_delay=1.0, budget_ratio=0.05, burst=10, window=500, min_samples=20):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.budget_ratio = budget_ratio
+        self.burst = burst
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._budget = float(burst)
+        self._lock = threading.Lock()
+        HEDGE_DELAY.set_function(self.delay)
+
+    def record(self, seconds):
+        """Adds the latency of a completed primary-model request."""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def delay(self):
+        """Returns the seconds to wait for the primary model before hedging."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.min_delay
+            latencies = sorted(self._latencies)
+        rank = max(0, math.ceil(self.percentile / 100 * len(latencies)) - 1)
+        return max(self.min_delay, latencies[rank])
+
+    def admit(self):
+        """Credits the hedge budget for a new request."""
+        with self._lock:
+            self._budget = min(float(self.burst), self._budget + self.budget_ratio)
+
+    def try_hedge(self):
+        """Spends one hedge from the budget; returns False if it is exhausted."""
+        with self._lock:
+            if self._budget < 1:
+                return False
+            self._budget -= 1
+            return True
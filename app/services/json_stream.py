@@ -0,0 +1,65 @@
+import json
+
+
+class MedicationStreamParser:
+    """
+    Incremental parser for a streamed extraction response, {"medications": [{...}, ...]} or a bare
+    [{...}, ...] list: every medication object is returned as soon as its closing brace arrives,
+    instead of after the whole completion.
+
+    Only the characters fed since the previous call are scanned (tracking nesting, strings and
+    escapes); the text of each finished object is decoded with json.loads.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None  # Nesting depth of the medication object being read, while inside one
+        self._object_chars = []
+
+    def feed(self, chunk):
+        """
+        Consumes the next piece of the response.
+
+        Returns:
+            list: The medication objects completed by this piece.
+
+        Raises:
+            json.JSONDecodeError: If a completed object is not valid JSON.
+        """
+        self._buffer.append(chunk)
+        completed = []
+        for char in chunk:
+            if self._object_start is not None:
+                self._object_chars.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                # A medication is an object directly inside the top-level list, or inside the list
+                # that is the value of the top-level object
+                if char == '{' and self._stack and self._stack[-1] == '[' and len(self._stack) <= 2:
+                    self._object_start = len(self._stack)
+                    self._object_chars = ['{']
+                self._stack.append(char)
+            elif char in '}]' and self._stack:
+                self._stack.pop()
+                if char == '}' and self._object_start == len(self._stack):
+                    completed.append(json.loads(''.join(self._object_chars)))
+                    self._object_start = None
+                    self._object_chars = []
+        return completed
+
+    @property
+    def text(self):
+        """The response text fed so far."""
+        return ''.join(self._buffer)
@@ -0,0 +1,209 @@
+import time
+import random
+import logging
+import threading
+
+import httpx
+from groq import Groq, APIConnectionError, RateLimitError, InternalServerError
+from config import Config
+from app.services.metrics import LLM_CALL, BACKUP_FALLBACKS
+
+# Errors worth retrying: throttling, network problems/timeouts and 5xx responses
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+
+class CircuitOpenError(Exception):
+    """Raised when every candidate model's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker.
+
+    After `failure_threshold` consecutive failed calls the circuit opens and calls are refused
+    for `reset_timeout` seconds. Then a single trial call is let through (half-open): success
+    closes the circuit, failure opens it again, and an error that says nothing about the model's
+    health (e.g. a bad request) lets the next call be the trial.
+    """
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = failure_threshold or Config.LLM_BREAKER_FAILURES
+        self.reset_timeout = reset_timeout or Config.LLM_BREAKER_RESET_TIMEOUT
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow_request(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_progress:
+                return False
+            self._trial_in_progress = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def release_trial(self):
+        """Ends a call that neither succeeded nor failed in a way that counts against the model."""
+        with self._lock:
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_progress or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_progress = False
+
+
+_client = None
+_breakers = {}
+_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the process-wide Groq client.
+
+    The client keeps a pool of keep-alive connections, so calls after the first do not pay
+    for connection and TLS setup. The SDK's own retries are disabled; create_chat_completion
+    retries instead.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                http_client = httpx.Client(
+                    limits=httpx.Limits(max_connections=Config.LLM_MAX_CONNECTIONS,
+                                        max_keepalive_connections=Config.LLM_MAX_CONNECTIONS,
+                                        keepalive_expiry=Config.LLM_KEEPALIVE_EXPIRY),
+                    timeout=Config.LLM_TIMEOUT)
+                _client = Groq(api_key=Config.LLM_API_KEY, base_url=Config.LLM_BASE_URL or None,
+                               http_client=http_client, max_retries=0)
+    return _client
+
+
+def reset_client_after_fork():
+    """Makes a forked child open its own connections instead of sharing the parent's pooled sockets."""
+    global _client
+    _client = None
+
+
+def get_breaker(model):
+    """Returns the circuit breaker of a model."""
+    with _lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker()
+        return _breakers[model]
+
+
+def retry_after(error):
+    """Returns the retry-after delay (seconds) sent with an API error, if any."""
+    try:
+        return float(error.response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, error=None):
+    """
+    Returns how long to wait before retry number `attempt` (1-based): the server's retry-after
+    if it sent one, otherwise exponential backoff with full jitter; at most Config.LLM_BACKOFF_MAX.
+    """
+    delay = retry_after(error) if error is not None else None
+    if delay is not None:
+        return min(max(0.0, delay), Config.LLM_BACKOFF_MAX)
+    return random.uniform(0, min(Config.LLM_BACKOFF_MAX, Config.LLM_BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+def create_chat_completion(messages, model, rate_limiter=None, estimated_tokens=0, fallback=True, **kwargs):
+    """
+    Sends a chat completion request through the shared client, with retries and failover.
+
+    Retryable errors are retried up to Config.LLM_MAX_RETRIES times with backoff. Every failed
+    attempt counts against the model's circuit breaker; while the primary model's circuit is
+    open (or once it opens), requests go to Config.BACKUP_MODEL instead.
+
+    Args:
+        messages (list): Chat messages.
+        model (str): The model to use.
+        rate_limiter (RateLimiter): Optional limiter to acquire before each attempt and to notify
+                                    about rate-limit errors and token usage.
+        estimated_tokens (int): Token estimate of the request, for the rate limiter.
+        fallback (bool): Whether requests for Config.MODEL may fail over to Config.BACKUP_MODEL.
+        **kwargs: Passed on to client.chat.completions.create.
+
+    Returns:
+        The chat completion; with stream=True, the stream of completion chunks (errors while the
+        stream is read are not retried).
+
+    Raises:
+        The last API error if all attempts failed, or CircuitOpenError if no model was available.
+    """
+    models = [model]
+    if fallback and model == Config.MODEL and Config.BACKUP_MODEL and Config.BACKUP_MODEL != model:
+        models.append(Config.BACKUP_MODEL)
+
+    client = get_client()
+    last_error = None
+    for candidate in models:
+        breaker = get_breaker(candidate)
+        attempt = 0
+        while breaker.allow_request():
+            if rate_limiter is not None:
+                rate_limiter.acquire(estimated_tokens)
+            started = time.perf_counter()
+            try:
+                chat_completion = client.chat.completions.create(messages=messages, model=candidate, **kwargs)
+            except Exception as e:
+                LLM_CALL.observe(time.perf_counter() - started, model=candidate, outcome=type(e).__name__)
+                if not isinstance(e, RETRYABLE_ERRORS):
+                    breaker.release_trial()  # Otherwise a half-open circuit would wait on this trial forever
+                    raise
+                breaker.record_failure()
+                last_error = e
+                if isinstance(e, RateLimitError) and rate_limiter is not None:
+                    server_delay = retry_after(e)
+                    rate_limiter.on_rate_limited(None if server_delay is None else min(server_delay, Config.LLM_BACKOFF_MAX))
+                attempt += 1
+                if attempt > Config.LLM_MAX_RETRIES or breaker.state == 'open':
+                    break
+                if isinstance(e, RateLimitError) and rate_limiter is not None:
+                    # The limiter paces the retry (acquire waits out its pause)
+                    logging.warning(f"Rate limited by model {candidate}, retry {attempt} of {Config.LLM_MAX_RETRIES}")
+                    continue
+                delay = backoff_delay(attempt, e)
+                logging.warning(f"{type(e).__name__} from model {candidate}, retry {attempt} of "
+                                f"{Config.LLM_MAX_RETRIES} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            LLM_CALL.observe(time.perf_counter() - started, model=candidate, outcome='ok')
+            breaker.record_success()
+            # Streamed responses (stream=True) have no usage until they are consumed
+            if rate_limiter is not None and getattr(chat_completion, 'usage', None) is not None:
+                rate_limiter.record_usage(estimated_tokens, chat_completion.usage.total_tokens)
+            if candidate != model:
+                BACKUP_FALLBACKS.inc(reason='llm_failure')
+                logging.warning(f"Served by backup model {candidate} instead of {model}")
+            return chat_completion
+        if breaker.state != 'closed':
+            logging.warning(f"Circuit for model {candidate} is open; trying the next model")
+
+    if last_error is not None:
+        raise last_error
+    raise CircuitOpenError(f"No model available (circuit open for {', '.join(models)})")
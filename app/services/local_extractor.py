@@ -0,0 +1,107 @@
+import re
+import threading
+
+from config import Config
+from app.services.utils import clean_and_split_drug_names, strip_salt_suffixes
+from app.services.reference_store import get_reference_store
+
+# Values that mean "no medications" in structured inputs such as NHANES drug_concat
+NO_MEDICATION_VALUES = frozenset(['', 'n/a', 'na', 'nan', 'none'])
+
+_stats_lock = threading.Lock()
+_stats = {'tokens': 0, 'local_tokens': 0}
+
+
+def resolve_drug_name(token, reference_table):
+    """
+    Resolves one lowercased drug token against the reference lexicon.
+
+    The alias table (generic, salt-stripped and brand names) is probed first. Otherwise the
+    token itself is fuzzy-matched (so salts that are drugs in their own right, like
+    'potassium chloride', keep their name), then the token without its salt suffixes.
+
+    Returns:
+        str: The reference drug name, or None if there is no alias and neither form matches
+             with at least Config.LOCAL_MATCH_THRESHOLD.
+    """
+    alias = reference_table.aliases.lookup(token)
+    if alias is not None:
+        return reference_table.names[alias[0]]
+    matcher = reference_table.matcher
+    for candidate in dict.fromkeys([token, strip_salt_suffixes(token)]):
+        index, score = matcher.match(candidate)
+        if index is not None and score >= Config.LOCAL_MATCH_THRESHOLD:
+            return matcher.names[index]
+    return None
+
+
+def _medication(name, normalized_name):
+    return {'name': name, 'normalized_name': normalized_name, 'dosage': None, 'frequency': None, 'date': None}
+
+
+def extract_medications_locally(user_input):
+    """
+    Extracts medications from a structured drug list without calling the LLM.
+
+    The input is split with clean_and_split_drug_names and each drug is resolved against the
+    names in the reference data.
+
+    Args:
+        user_input (str): A delimited drug list, e.g. "DOXAZOSIN MESYLATE, FUROSEMIDE".
+
+    Returns:
+        tuple: (medications, unresolved). `medications` holds medication dictionaries (same keys as
+               extract_medications_from_groq) for the resolved drugs; `unresolved` lists the tokens
+               that could not be resolved confidently.
+    """
+    if re.sub(r"\s+", " ", str(user_input)).strip().lower() in NO_MEDICATION_VALUES:
+        return [], []
+
+    reference_table = get_reference_store().get()
+    medications = []
+    unresolved = []
+    for token in clean_and_split_drug_names(user_input):
+        token = re.sub(r"\s+", " ", token)
+        normalized_name = resolve_drug_name(token, reference_table)
+        if normalized_name is None:
+            unresolved.append(token)
+        else:
+            medications.append(_medication(token, normalized_name))
+
+    with _stats_lock:
+        _stats['tokens'] += len(medications) + len(unresolved)
+        _stats['local_tokens'] += len(medications)
+    return medications, unresolved
+
+
+def escalation_input(unresolved):
+    """Returns the text to send to the LLM for the unresolved tokens of an input."""
+    return ', '.join(unresolved)
+
+
+def combine_with_escalation(medications, unresolved, escalated):
+    """
+    Merges a local extraction with the LLM result for its unresolved tokens.
+
+    Args:
+        medications (list): Locally resolved medications.
+        unresolved (list): Tokens that were not resolved locally.
+        escalated (list): The LLM extraction of escalation_input(unresolved), or None if it
+                          failed or was not requested. When None, unresolved tokens are kept as
+                          medications under their salt-stripped name.
+
+    Returns:
+        list: The combined medication list, local results first.
+    """
+    if escalated is None:
+        escalated = [_medication(token, strip_salt_suffixes(token)) for token in unresolved]
+    return medications + escalated
+
+
+def get_local_extraction_stats():
+    """Returns how many drug tokens were seen and resolved locally, and the local fraction."""
+    with _stats_lock:
+        tokens = _stats['tokens']
+        local_tokens = _stats['local_tokens']
+    return {'tokens': tokens, 'local_tokens': local_tokens,
+            'local_fraction': local_tokens / tokens if tokens else 0.0}
@@ -0,0 +1,123 @@
+import json
+import queue
+import atexit
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from config import Config
+from app.services.metrics import LOG_RECORDS_DROPPED
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else on a record came from `extra=` and is logged as a field
+RECORD_ATTRIBUTES = frozenset(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+_lock = threading.Lock()
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line, with the `extra=` fields of the call."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of high-volume records. A call opts in with `extra={'sample': key}`;
+    records whose key has a rate in `rates` are kept with that probability, all others always.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, 'sample', None))
+        return rate is None or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the background writer without formatting them or ever waiting.
+
+    Messages are formatted by the writer thread (so %-style arguments must not be mutated after
+    the call), and a record that finds the queue full is dropped and counted in
+    dili_log_records_dropped_total instead of blocking the request thread.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+def setup_logging(filename=None, level=None, log_format=None):
+    """
+    Routes the root logger through a bounded queue to a background thread that writes the log file.
+
+    Request threads only filter and enqueue records; formatting and file I/O happen on the writer
+    thread. Safe to call more than once: later calls keep the running setup. Records still queued
+    are written at interpreter exit.
+
+    Args:
+        filename (str): Log file (default: Config.LOG_FILE).
+        level (str): Root log level (default: Config.LOG_LEVEL).
+        log_format (str): 'json' for one JSON object per record, 'text' for the plain format
+                          (default: Config.LOG_FORMAT).
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        file_handler = logging.FileHandler(filename or Config.LOG_FILE, encoding='utf-8')
+        if (log_format or Config.LOG_FORMAT) == 'json':
+            file_handler.setFormatter(JsonFormatter())
+        else:
+            file_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+        queue_handler = NonBlockingQueueHandler(queue.Queue(Config.LOG_QUEUE_SIZE))
+        queue_handler.addFilter(SamplingFilter(Config.LOG_SAMPLE_RATES))
+
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level or Config.LOG_LEVEL)
+
+        _listener = QueueListener(queue_handler.queue, file_handler)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def restart_logging_after_fork():
+    """
+    Sets up logging again in a forked child. The parent's writer thread does not exist in the
+    child, so records put on the inherited queue would never be written.
+    """
+    global _listener
+    if _listener is not None:
+        atexit.unregister(_listener.stop)
+        _listener = None
+    setup_logging()
@@ -0,0 +1,123 @@
+import os
+import glob
+import shutil
+import logging
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# One row per (seqn, extracted drug); rows of inputs without an extraction have a null drug
+COLUMNS = ['seqn', 'extracted_drug', 'matched_drug', 'match_score', 'dili_likelihood', 'livertox_score']
+STRING_FIELDS = [pa.field(name, pa.string()) for name in ('extracted_drug', 'matched_drug')]
+RISK_FIELDS = [pa.field(name, pa.string()) for name in ('dili_likelihood', 'livertox_score')]
+COMPRESSION = 'zstd'
+
+
+def aggregate_path(path):
+    """Returns where the per-drug aggregate of a long-format output is written: <path>.by_drug.parquet."""
+    return os.path.normpath(path) + '.by_drug.parquet'
+
+
+class LongFormatWriter:
+    """
+    Writes long-format NHANES results as a directory of compressed Parquet files, one per
+    processed chunk, so each chunk is durable as soon as it is written and nothing is rewritten.
+
+    The directory reads back as one table, e.g. pd.read_parquet(path) or pyarrow.dataset.dataset(path).
+    """
+
+    def __init__(self, path, parts=0):
+        """
+        Args:
+            path (str): Output directory (created if needed).
+            parts (int): Number of parts to keep from an earlier, checkpointed run; later parts
+                         (written after the last checkpoint) are deleted.
+        """
+        self.path = path
+        self.parts = parts
+        os.makedirs(path, exist_ok=True)
+        for part_file in glob.glob(os.path.join(path, 'part-*.parquet')):
+            if _part_number(part_file) is None or _part_number(part_file) >= parts:
+                os.remove(part_file)
+
+    def write(self, df):
+        """
+        Appends one part.
+
+        Args:
+            df (DataFrame): Rows with the COLUMNS columns. seqn is stored as an integer when it is
+                            one, as text otherwise.
+        """
+        seqn_type = pa.int64() if df['seqn'].dtype.kind in 'iu' else pa.string()
+        schema = pa.schema([pa.field('seqn', seqn_type), *STRING_FIELDS, pa.field('match_score', pa.int16()),
+                            *RISK_FIELDS])
+        if seqn_type == pa.string():
+            df = df.assign(seqn=df['seqn'].map(str))
+        table = pa.Table.from_pandas(df[COLUMNS], schema=schema, preserve_index=False)
+
+        part_file = os.path.join(self.path, f"part-{self.parts:05d}.parquet")
+        temp_file = part_file + '.tmp'
+        pq.write_table(table, temp_file, compression=COMPRESSION)
+        with open(temp_file, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(temp_file, part_file)
+        self.parts += 1
+
+    def write_aggregate(self):
+        """Writes the per-drug aggregate of everything in the directory (see write_drug_aggregate)."""
+        return write_drug_aggregate(self.path)
+
+
+def _part_number(part_file):
+    try:
+        return int(os.path.basename(part_file)[len('part-'):-len('.parquet')])
+    except ValueError:
+        return None
+
+
+def write_drug_aggregate(path):
+    """
+    Aggregates a long-format output per extracted drug into <path>.by_drug.parquet: the matched
+    reference drug, match score, DILI likelihood and LiverTox score, the number of participants
+    (distinct seqns) and rows mentioning the drug, most common drugs first.
+
+    Returns:
+        str: The path of the aggregate file.
+    """
+    table = ds.dataset(path, format='parquet').to_table()
+    table = table.filter(pc.is_valid(table['extracted_drug']))
+    by_drug = table.group_by('extracted_drug', use_threads=False).aggregate([
+        ('matched_drug', 'first'), ('match_score', 'first'), ('dili_likelihood', 'first'),
+        ('livertox_score', 'first'), ('seqn', 'count_distinct'), ('seqn', 'count'),
+    ])
+    by_drug = pa.table({
+        'extracted_drug': by_drug['extracted_drug'],
+        'matched_drug': by_drug['matched_drug_first'],
+        'match_score': by_drug['match_score_first'],
+        'dili_likelihood': by_drug['dili_likelihood_first'],
+        'livertox_score': by_drug['livertox_score_first'],
+        'participants': by_drug['seqn_count_distinct'],
+        'rows': by_drug['seqn_count'],
+    })
+    by_drug = by_drug.sort_by([('participants', 'descending'), ('extracted_drug', 'ascending')])
+
+    output_file = aggregate_path(path)
+    pq.write_table(by_drug, output_file, compression=COMPRESSION)
+    logging.info(f"Wrote per-drug aggregate of {table.num_rows} long-format rows to {output_file} "
+                 f"({by_drug.num_rows} drugs)")
+    return output_file
+
+
+def merge_long_outputs(paths, output_path):
+    """
+    Combines the long-format outputs of several shards into `output_path` (copying their parts,
+    which are left in place) and writes its per-drug aggregate.
+    """
+    writer = LongFormatWriter(output_path)
+    for path in paths:
+        for part_file in sorted(glob.glob(os.path.join(path, 'part-*.parquet'))):
+            shutil.copyfile(part_file, os.path.join(output_path, f"part-{writer.parts:05d}.parquet"))
+            writer.parts += 1
+    return writer.write_aggregate()
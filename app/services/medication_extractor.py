@@ -1,9 +1,18 @@
 import os
 import json
 import time
+import hashlib
 import logging
-from groq import Groq, APIConnectionError, RateLimitError, APIStatusError, APIResponseValidationError
+import sqlite3
+import threading
+from collections import Counter
+from groq import APIConnectionError, RateLimitError, APIStatusError, APIResponseValidationError
 from app.services.utils import contains_drug_names, clean_and_split_drug_names
+from app.services.llm_client import create_chat_completion, CircuitOpenError
+from app.services.metrics import JSON_PARSE, MEDICATIONS_EXTRACTED
+from app.services.extraction_cache import get_extraction_cache, make_cache_key
+from app.services.local_extractor import extract_medications_locally, escalation_input, combine_with_escalation
+from app.services.json_stream import MedicationStreamParser
 from config import Config
 
 import sys
@@ -14,19 +23,44 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..
 # Add the project root to the Python path
 sys.path.insert(0, project_root)
 
-logging.basicConfig(filename='app.log', level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
-medication_counts = {}
-total_medications_processed = 0
-total_meds=0
+SYSTEM_PROMPT = """
+    You are a medical expert system. Extract the medication names, dosages, frequencies, and their associated dates from the following unstructured text.
+    Normalize the medication names to their most common or standardized form. Make sure the medication names are in common name. Must be a directed JSON, no data in front of the result.
+    Return the results as a JSON array of objects, where each object has the keys 'name', 'normalized_name', 'dosage', 'frequency', and 'date'. All letter in normalized name must be all lowercase.If the input text does not contain any medication information, return an empty JSON array ( [] ).
+If no matching, can use the the same word for name, and N/A for normalized_name  If dosage, frequency, or date is not found, use null. Do not provide any conversational filler, only JSON output.
+    """
 
-def extract_medications_from_groq(user_input, model):
+BATCH_SYSTEM_PROMPT = """
+    You are a medical expert system. You will receive a JSON object that maps record ids to unstructured texts. For each record, extract the medication names, dosages, frequencies, and their associated dates from its text.
+    Normalize the medication names to their most common or standardized form. Make sure the medication names are in common name. Must be a directed JSON, no data in front of the result.
+    Return a JSON object of the form {"results": {"<record id>": [...]}} with one entry for every record id, where each list holds objects with the keys 'name', 'normalized_name', 'dosage', 'frequency', and 'date'. All letter in normalized name must be all lowercase. If a record does not contain any medication information, use an empty list ( [] ) for it.
+If no matching, can use the the same word for name, and N/A for normalized_name  If dosage, frequency, or date is not found, use null. Do not provide any conversational filler, only JSON output.
+    """
+
+# Part of every extraction cache key, so editing a prompt invalidates cached results
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode('utf-8')).hexdigest()[:12]
+BATCH_PROMPT_VERSION = hashlib.sha256(BATCH_SYSTEM_PROMPT.encode('utf-8')).hexdigest()[:12]
+
+# Per-drug counts for log_medication_counts. The names come from LLM output, so at most
+# MEDICATION_COUNTS_MAX_DRUGS distinct names are kept; names first seen after that count as 'other'
+MEDICATION_COUNTS_MAX_DRUGS = 1000
+medication_counts = Counter()
+_medication_counts_lock = threading.Lock()
+
+def extract_medications_from_groq(user_input, model, use_cache=None, rate_limiter=None):
     """
     Extracts medication information (including individual dates) from unstructured text using the Groq API.
 
+    Results are cached by canonicalized input, model and prompt version (see extraction_cache.py),
+    so repeated inputs skip the API call.
+
     Args:
         user_input (str): Unstructured text containing medication names, dosages, frequencies, and dates.
         model (str): The Groq model to use.
+        use_cache (bool): Read and write the extraction cache (default: Config.EXTRACTION_CACHE_ENABLED).
+                          Pass False for evaluation runs that must hit the model.
+        rate_limiter (RateLimiter): Shared limiter to pace API calls with. Without one, every call
+                                    is preceded by a fixed 2-second delay.
 
     Returns:
         list: A list of dictionaries, where each dictionary represents a medication
@@ -37,98 +71,462 @@ def extract_medications_from_groq(user_input, model):
         logging.error("User input must be a non-empty string.")
         raise ValueError("User input must be a non-empty string.")
 
-    global medication_counts
-    global total_medications_processed
-    client = Groq(api_key=Config.GROQ_API_KEY)
+    if use_cache is None:
+        use_cache = Config.EXTRACTION_CACHE_ENABLED
 
-    system_prompt = """
-    You are a medical expert system. Extract the medication names, dosages, frequencies, and their associated dates from the following unstructured text.
-    Normalize the medication names to their most common or standardized form. Make sure the medication names are in common name. Must be a directed JSON, no data in front of the result.
-    Return the results as a JSON array of objects, where each object has the keys 'name', 'normalized_name', 'dosage', 'frequency', and 'date'. All letter in normalized name must be all lowercase.If the input text does not contain any medication information, return an empty JSON array ( [] ).
-If no matching, can use the the same word for name, and N/A for normalized_name  If dosage, frequency, or date is not found, use null. Do not provide any conversational filler, only JSON output.
+    cache_key = None
+    if use_cache:
+        try:
+            cache_key = make_cache_key(user_input, model, PROMPT_VERSION)
+            medication_list = get_extraction_cache().get(cache_key)
+            if medication_list is not None:
+                _count_medications(medication_list)
+                return medication_list
+        except sqlite3.Error as e:
+            logging.error("Extraction cache lookup failed, calling the API instead: %s", e)
+            cache_key = None
+
+    medication_list = _request_medications(user_input, model, rate_limiter)
+    if medication_list is None:
+        return None
+    _count_medications(medication_list)
+
+    if cache_key is not None:
+        try:
+            get_extraction_cache().put(cache_key, medication_list)
+        except sqlite3.Error as e:
+            logging.error("Could not store extraction in cache: %s", e)
+    return medication_list
+
+def stream_medications_from_groq(user_input, model, use_cache=None, rate_limiter=None):
     """
+    Streaming variant of extract_medications_from_groq: a generator that yields each medication
+    as soon as the model has finished generating it, so callers can work on the first
+    medications (e.g. look up their DILI risk) while the rest is still being generated.
 
-    user_prompt = f"""
+    The whole response is validated once it is complete; only then is it counted and cached.
+    A cached extraction is yielded at once.
+
+    Args:
+        user_input, model, use_cache, rate_limiter: See extract_medications_from_groq.
+
+    Yields:
+        dict: The next medication.
+
+    Returns:
+        list: The complete, validated medication list (the generator's return value), or None if
+              the response failed, e.g. broke off or turned out invalid after some medications
+              were already yielded.
+    """
+    if not user_input or not isinstance(user_input, str):
+        logging.error("User input must be a non-empty string.")
+        raise ValueError("User input must be a non-empty string.")
+
+    if use_cache is None:
+        use_cache = Config.EXTRACTION_CACHE_ENABLED
+
+    cache_key = None
+    if use_cache:
+        try:
+            cache_key = make_cache_key(user_input, model, PROMPT_VERSION)
+            medication_list = get_extraction_cache().get(cache_key)
+        except sqlite3.Error as e:
+            logging.error("Extraction cache lookup failed, calling the API instead: %s", e)
+            cache_key = None
+        else:
+            if medication_list is not None:
+                _count_medications(medication_list)
+                yield from medication_list
+                return medication_list
+
+    medication_list = yield from _stream_request_medications(user_input, model, rate_limiter)
+    if medication_list is None:
+        return None
+    _count_medications(medication_list)
+
+    if cache_key is not None:
+        try:
+            get_extraction_cache().put(cache_key, medication_list)
+        except sqlite3.Error as e:
+            logging.error("Could not store extraction in cache: %s", e)
+    return medication_list
+
+def extract_medications(user_input, model, mode=None, use_cache=None, rate_limiter=None):
+    """
+    Extracts medications with the selected extractor.
+
+    Args:
+        user_input (str): Unstructured text or a delimited drug list.
+        model (str): The Groq model to use for anything sent to the LLM.
+        mode (str): 'llm' sends the whole input to extract_medications_from_groq. 'local' resolves
+                    the drug list against the reference data only (see local_extractor.py). 'hybrid'
+                    resolves locally and sends only the unresolved drugs to the LLM.
+                    Default: Config.EXTRACTION_MODE.
+        use_cache, rate_limiter: See extract_medications_from_groq.
+
+    Returns:
+        list: The extracted medications, or None if an error occurs.
+    """
+    mode = mode or Config.EXTRACTION_MODE
+    if mode == 'llm':
+        return extract_medications_from_groq(user_input, model, use_cache=use_cache, rate_limiter=rate_limiter)
+    if mode not in ('local', 'hybrid'):
+        raise ValueError(f"Unknown extraction mode: {mode}")
+
+    medications, unresolved = extract_medications_locally(user_input)
+    escalated = None
+    if unresolved and mode == 'hybrid':
+        escalated = extract_medications_from_groq(escalation_input(unresolved), model,
+                                                  use_cache=use_cache, rate_limiter=rate_limiter)
+    medication_list = combine_with_escalation(medications, unresolved, escalated)
+    # Medications that came back from the LLM were already counted
+    _count_medications(medications if escalated is not None else medication_list)
+    return medication_list
+
+def _count_medications(medication_list):
+    MEDICATIONS_EXTRACTED.inc(len(medication_list))
+    with _medication_counts_lock:
+        for medication in medication_list:
+            drug = medication['normalized_name'].lower()
+            if drug not in medication_counts and len(medication_counts) >= MEDICATION_COUNTS_MAX_DRUGS:
+                drug = 'other'
+            medication_counts[drug] += 1
+
+def _create_completion(user_prompt, model, rate_limiter, system_prompt=SYSTEM_PROMPT, max_tokens=5000, stream=False):
+    """
+    Sends the chat completion request through the shared LLM client, which retries failed
+    calls and fails over to the backup model. With a rate limiter, the client waits for its
+    permission before each attempt. With stream=True, returns the stream of completion chunks.
+    """
+    if rate_limiter is None and Config.LLM_CALL_DELAY:
+        # Introduce a delay (2 seconds by default) before the API call
+        time.sleep(Config.LLM_CALL_DELAY)
+
+    # Rough token estimate (4 characters per token, output about half the input) for the limiter
+    estimated_tokens = (len(system_prompt) + len(user_prompt)) // 4 + len(user_prompt) // 8
+    # JSON mode cannot be combined with streaming; the prompt asks for JSON only either way
+    options = {'stream': True} if stream else {'response_format': {"type": "json_object"}}
+    return create_chat_completion(
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        model=model,
+        rate_limiter=rate_limiter,
+        estimated_tokens=estimated_tokens,
+        max_tokens=max_tokens,
+        temperature=0.2,
+        **options
+    )
+
+def _validate_medication_list(medication_list):
+    """Checks the structure of each medication object in an extracted list."""
+    if not isinstance(medication_list, list):
+        logging.error("Invalid medication list in response (not a list).")
+        return False
+    for medication in medication_list:
+        if not isinstance(medication, dict):
+            logging.error("Invalid medication format in response (not a dictionary).")
+            return False
+        required_keys = ["name", "normalized_name"]  # Only require name and normalized_name
+        if not all(key in medication for key in required_keys):
+            logging.error("Missing required keys in medication: %s", medication)
+            return False
+        if not isinstance(medication['normalized_name'], str):
+            logging.error("Invalid normalized_name in medication: %s", medication)
+            return False
+        # Log if optional keys are null
+        for key in ["dosage", "frequency", "date"]:
+            if key in medication and medication[key] is None:
+                logging.info("Optional key '%s' is null for medication: %s", key, medication['name'],
+                             extra={'sample': 'llm_response'})
+    return True
+
+def _user_prompt(user_input):
+    return f"""
     Unstructured Text:
     {user_input}
 
     JSON Output:
     """
 
-    try:
-        # Introduce a 2-second delay before the API call
-        time.sleep(2)
-
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            model=model,
-            max_tokens=5000,
-            temperature=0.2,
-            response_format={ "type": "json_object" }
-        )
-
-        medication_json_str = chat_completion.choices[0].message.content
-        logging.info(f"Raw response content: {medication_json_str}")
+def _parse_response(medication_json_str):
+    """
+    Parses and validates the content of a single extraction response.
 
-        if not medication_json_str:
-            logging.error("No medication information extracted by Groq API (empty response).")
-            return None
+    Returns:
+        list: The validated medication list, or None if the response is empty or invalid.
+    """
+    if not medication_json_str:
+        logging.error("No medication information extracted by Groq API (empty response).")
+        return None
 
-        try:
-            response_data = json.loads(medication_json_str)
-            if "medications" in response_data:
-                medication_list = response_data["medications"]
-            elif isinstance(response_data, list):
-                medication_list = response_data
-            else:
-                logging.error("Invalid response format: Expected a list or a dictionary with a 'medications' key.")
-                return None
-
-        except json.JSONDecodeError as e:
-            logging.error(f"Invalid JSON response from Groq API: {e}")
+    try:
+        response_data = json.loads(medication_json_str)
+        if "medications" in response_data:
+            medication_list = response_data["medications"]
+        elif isinstance(response_data, list):
+            medication_list = response_data
+        else:
+            logging.error("Invalid response format: Expected a list or a dictionary with a 'medications' key.")
             return None
 
-        # Validate the structure of each medication object
-        for medication in medication_list:
-            if not isinstance(medication, dict):
-                logging.error("Invalid medication format in response (not a dictionary).")
-                return None
-            required_keys = ["name", "normalized_name"]  # Only require name and normalized_name
-            if not all(key in medication for key in required_keys):
-                logging.error(f"Missing required keys in medication: {medication}")
-                return None
-            # Log if optional keys are null
-            for key in ["dosage", "frequency", "date"]:
-                if key in medication and medication[key] is None:
-                    logging.info(f"Optional key '{key}' is null for medication: {medication['name']}")
-
-            # Update medication counts
-            normalized_name = medication['normalized_name'].lower()
-            medication_counts[normalized_name] = medication_counts.get(normalized_name, 0) + 1
-            total_medications_processed += 1
-        return medication_list
-
-    except APIConnectionError as e:
-        logging.error(f"The server could not be reached: {e.__cause__}")
+    except json.JSONDecodeError as e:
+        logging.error("Invalid JSON response from Groq API: %s", e)
         return None
-    except RateLimitError as e:
-        logging.error(f"A 429 status code was received (rate limit exceeded); we should back off a bit: {e}")
+
+    if not _validate_medication_list(medication_list):
         return None
-    except APIStatusError as e:
-        logging.error(f"Another non-200-range status code was received: {e.status_code} - {e.response}")
+    return medication_list
+
+def _request_medications(user_input, model, rate_limiter=None):
+    """
+    Sends one extraction request to the Groq API and validates the response.
+
+    Returns:
+        list: The validated medication list, or None if an error occurs.
+    """
+    try:
+        chat_completion = _create_completion(_user_prompt(user_input), model, rate_limiter)
+
+        medication_json_str = chat_completion.choices[0].message.content
+        logging.info("Raw response content: %s", medication_json_str, extra={'sample': 'llm_response'})
+        with JSON_PARSE.time(kind='single'):
+            return _parse_response(medication_json_str)
+
+    except Exception as e:
+        _log_request_error(e)
         return None
-    except APIResponseValidationError as e:
-        logging.error(f"Response validation error: {e}")
+
+def _stream_request_medications(user_input, model, rate_limiter=None):
+    """
+    Sends one extraction request as a stream, yields each medication as soon as its object is
+    complete and validates the whole response at the end.
+
+    Returns:
+        list: The validated medication list (as the generator's return value), or None if an error occurs.
+    """
+    parser = MedicationStreamParser()
+    parse_seconds = 0.0
+    try:
+        stream = _create_completion(_user_prompt(user_input), model, rate_limiter, stream=True)
+        try:
+            for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                started = time.perf_counter()
+                medications = parser.feed(chunk.choices[0].delta.content)
+                valid = _validate_medication_list(medications)
+                parse_seconds += time.perf_counter() - started
+                if not valid:
+                    return None
+                yield from medications
+        finally:
+            stream.close()  # Also when the consumer stops early: drops the connection instead of reading on
+    except json.JSONDecodeError as e:
+        logging.error("Invalid JSON in streamed response from Groq API: %s", e)
         return None
     except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
+        _log_request_error(e)
         return None
 
+    medication_json_str = parser.text
+    logging.info("Raw response content: %s", medication_json_str, extra={'sample': 'llm_response'})
+    started = time.perf_counter()
+    medication_list = _parse_response(medication_json_str)
+    JSON_PARSE.observe(parse_seconds + time.perf_counter() - started, kind='stream')
+    return medication_list
+
+def _log_request_error(e):
+    """Logs why an extraction request failed."""
+    if isinstance(e, APIConnectionError):
+        logging.error("The server could not be reached: %s", e.__cause__)
+    elif isinstance(e, RateLimitError):
+        logging.error("A 429 status code was received (rate limit exceeded); we should back off a bit: %s", e)
+    elif isinstance(e, APIStatusError):
+        logging.error("Another non-200-range status code was received: %s - %s", e.status_code, e.response)
+    elif isinstance(e, APIResponseValidationError):
+        logging.error("Response validation error: %s", e)
+    elif isinstance(e, CircuitOpenError):
+        logging.error("Request not sent: %s", e)
+    else:
+        logging.error("An unexpected error occurred: %s", e)
+
+def estimate_record_tokens(user_input):
+    """Rough prompt + output token estimate for one record of a batch (about 40 output tokens per drug)."""
+    return len(user_input) // 4 + 40 * max(1, len(clean_and_split_drug_names(user_input)))
+
+def pack_batches(records, token_budget=None, max_records=None):
+    """
+    Splits records into batches whose estimated token use stays within a budget.
+
+    Args:
+        records (dict): Record id -> unstructured text.
+        token_budget (int): Estimated tokens per batch (default: Config.BATCH_TOKEN_BUDGET).
+                            A record larger than the budget gets a batch of its own.
+        max_records (int): Records per batch (default: Config.BATCH_MAX_RECORDS).
+
+    Returns:
+        list: A list of dicts (record id -> text), in the order of `records`.
+    """
+    token_budget = token_budget or Config.BATCH_TOKEN_BUDGET
+    max_records = max_records or Config.BATCH_MAX_RECORDS
+    batches = []
+    batch = {}
+    batch_tokens = 0
+    for record_id, user_input in records.items():
+        record_tokens = estimate_record_tokens(user_input)
+        if batch and (batch_tokens + record_tokens > token_budget or len(batch) >= max_records):
+            batches.append(batch)
+            batch = {}
+            batch_tokens = 0
+        batch[record_id] = user_input
+        batch_tokens += record_tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+def extract_medications_batch(records, model, use_cache=None, rate_limiter=None, token_budget=None):
+    """
+    Extracts medications for several records, packing many records into each chat completion.
+
+    Every record is validated on its own; records that are missing from a response or fail to
+    parse are re-issued (in a new, smaller batch) up to Config.BATCH_RETRIES times. Cached records
+    are answered without an API call.
+
+    Args:
+        records (dict): Record id -> unstructured text.
+        model (str): The Groq model to use.
+        use_cache, rate_limiter: See extract_medications_from_groq.
+        token_budget (int): Estimated tokens per request (default: Config.BATCH_TOKEN_BUDGET).
+
+    Returns:
+        dict: Record id -> medication list (as returned by extract_medications_from_groq), or None
+              for records that could not be extracted.
+    """
+    if use_cache is None:
+        use_cache = Config.EXTRACTION_CACHE_ENABLED
+
+    results = {}
+    pending = {}
+    cache_keys = {}
+    for record_id, user_input in records.items():
+        if not user_input or not isinstance(user_input, str):
+            logging.error("Record %s: user input must be a non-empty string.", record_id)
+            results[record_id] = None
+            continue
+        if use_cache:
+            try:
+                cache_keys[record_id] = make_cache_key(user_input, model, BATCH_PROMPT_VERSION)
+                medication_list = get_extraction_cache().get(cache_keys[record_id])
+                if medication_list is not None:
+                    _count_medications(medication_list)
+                    results[record_id] = medication_list
+                    continue
+            except sqlite3.Error as e:
+                logging.error("Extraction cache lookup failed, calling the API instead: %s", e)
+        pending[record_id] = user_input
+
+    for attempt in range(Config.BATCH_RETRIES + 1):
+        if not pending:
+            break
+        if attempt:
+            logging.warning("Re-issuing %s record(s) that failed to parse (attempt %s)", len(pending), attempt)
+        failed = {}
+        for batch in pack_batches(pending, token_budget):
+            extracted = _request_medications_batch(batch, model, rate_limiter, token_budget)
+            for record_id, user_input in batch.items():
+                medication_list = extracted.get(record_id)
+                if medication_list is None:
+                    failed[record_id] = user_input
+                    continue
+                _count_medications(medication_list)
+                results[record_id] = medication_list
+                if record_id in cache_keys:
+                    try:
+                        get_extraction_cache().put(cache_keys[record_id], medication_list)
+                    except sqlite3.Error as e:
+                        logging.error("Could not store extraction in cache: %s", e)
+        pending = failed
+
+    for record_id in pending:
+        logging.error("No valid extraction for record %s after %s attempt(s)", record_id, Config.BATCH_RETRIES + 1)
+        results[record_id] = None
+    return {record_id: results[record_id] for record_id in records}
+
+def _request_medications_batch(batch, model, rate_limiter=None, token_budget=None):
+    """
+    Sends one batched extraction request and validates each record of the response on its own.
+
+    Returns:
+        dict: Record id -> validated medication list, for the records that parsed correctly.
+    """
+    # Ids are sent as strings, since JSON object keys are strings
+    ids = {str(record_id): record_id for record_id in batch}
+
+    user_prompt = f"""
+    Records:
+    {json.dumps({str(record_id): user_input for record_id, user_input in batch.items()})}
+
+    JSON Output:
+    """
+
+    try:
+        chat_completion = _create_completion(user_prompt, model, rate_limiter,
+                                             system_prompt=BATCH_SYSTEM_PROMPT,
+                                             max_tokens=token_budget or Config.BATCH_TOKEN_BUDGET)
+        medication_json_str = chat_completion.choices[0].message.content
+        logging.info("Raw batch response content: %s", medication_json_str, extra={'sample': 'llm_response'})
+    except (APIConnectionError, RateLimitError, APIStatusError, APIResponseValidationError, CircuitOpenError) as e:
+        logging.error("Batch extraction request failed: %s", e)
+        return {}
+    except Exception as e:
+        logging.error("An unexpected error occurred: %s", e)
+        return {}
+
+    with JSON_PARSE.time(kind='batch'):
+        return _parse_batch_response(medication_json_str, ids)
+
+def _parse_batch_response(medication_json_str, ids):
+    """
+    Parses a batched extraction response and validates each record on its own.
+
+    Args:
+        medication_json_str (str): The response content.
+        ids (dict): Record id as sent (string) -> record id.
+
+    Returns:
+        dict: Record id -> validated medication list, for the records that parsed correctly.
+    """
+    try:
+        response_data = json.loads(medication_json_str or 'null')
+    except json.JSONDecodeError as e:
+        logging.error("Invalid JSON response from Groq API for batch of %s: %s", len(ids), e)
+        return {}
+
+    if isinstance(response_data, dict) and isinstance(response_data.get("results"), dict):
+        response_data = response_data["results"]
+    if not isinstance(response_data, dict):
+        logging.error("Invalid batch response format: Expected a JSON object keyed by record id.")
+        return {}
+
+    extracted = {}
+    for key, medication_list in response_data.items():
+        if key not in ids:
+            logging.warning("Ignoring unknown record id in batch response: %s", key)
+            continue
+        if isinstance(medication_list, dict) and "medications" in medication_list:
+            medication_list = medication_list["medications"]
+        if _validate_medication_list(medication_list):
+            extracted[ids[key]] = medication_list
+        else:
+            logging.error("Invalid medications for record %s in batch response", key)
+    return extracted
+
 def log_medication_counts():
+    with _medication_counts_lock:
+        counts = dict(medication_counts)
     logging.info("Medication Counts:")
-    for drug, count in medication_counts.items():
-        logging.info(f"  {drug}: {count}")
-    logging.info(f"Total medications processed: {total_medications_processed}")
\ No newline at end of file
+    for drug, count in counts.items():
+        logging.info("  %s: %s", drug, count)
+    logging.info("Total medications processed: %s", sum(counts.values()))
\ No newline at end of file
@@ -0,0 +1,213 @@
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+# Latency buckets (seconds) shared by the histograms, from sub-millisecond matching to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class of the metric types: a named family of values keyed by label values."""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def values(self):
+        """Returns a copy of the values, keyed by label value tuples."""
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        """Yields (name suffix, label values, extra labels, value) for the exposition format."""
+        for labelvalues, value in sorted(self.values().items()):
+            yield '', labelvalues, None, value
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0  # Report 0 before the first increment
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down, set directly or read from a callback at collection time."""
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function, **labels):
+        """Reports function() as the value for these labels whenever the metrics are collected."""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def values(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, function in functions.items():
+            values[key] = function()
+        return values
+
+
+class Histogram(Metric):
+    """Counts observations (e.g. latencies in seconds) in cumulative buckets."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the with-block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def values(self):
+        with self._lock:
+            return {key: {'counts': list(state['counts']), 'sum': state['sum'], 'count': state['count']}
+                    for key, state in self._values.items()}
+
+    def samples(self):
+        for labelvalues, state in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                yield '_bucket', labelvalues, [('le', _format_value(bound))], cumulative
+            yield '_sum', labelvalues, None, state['sum']
+            yield '_count', labelvalues, None, state['count']
+
+
+class MetricsRegistry:
+    """Thread-safe collection of metrics, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Returns all metrics in the Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labelvalues, extra, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(metric.labelnames, labelvalues, extra)} "
+                             f"{_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+QUEUE_WAIT = registry.histogram('dili_queue_wait_seconds', 'Time API requests wait in a dispatcher queue.', ['queue'])
+LLM_CALL = registry.histogram('dili_llm_call_seconds', 'Duration of LLM API calls, per attempt.', ['model', 'outcome'])
+JSON_PARSE = registry.histogram('dili_json_parse_seconds', 'Time spent parsing and validating LLM responses.', ['kind'])
+DILI_MATCH = registry.histogram('dili_match_seconds', 'Time spent matching extracted drugs to the DILI reference data.')
+STREAM_FIRST_RESULT = registry.histogram('dili_stream_first_result_seconds', 'Time from receiving a streaming request '
+                                         'to sending its first medication.')
+
+QUEUE_DEPTH = registry.gauge('dili_queue_depth', 'API requests admitted but not yet running.', ['queue'])
+IN_FLIGHT = registry.gauge('dili_in_flight', 'API requests admitted (queued or running).', ['queue'])
+HEDGE_DELAY = registry.gauge('dili_hedge_delay_seconds', 'Time a primary-model request runs before it is hedged.')
+
+CACHE_HITS = registry.counter('dili_extraction_cache_hits_total', 'Extraction cache hits.', ['tier'])
+CACHE_MISSES = registry.counter('dili_extraction_cache_misses_total', 'Extraction cache misses.')
+BACKUP_FALLBACKS = registry.counter('dili_backup_fallbacks_total', 'Requests served by the backup model instead of '
+                                    'the requested one.', ['reason'])
+HEDGES = registry.counter('dili_hedged_requests_total', 'Primary-model requests still running at the hedge delay, by '
+                          'outcome.', ['outcome'])
+UNMATCHED_DRUGS = registry.counter('dili_unmatched_drugs_total', 'Extracted drugs without a DILI reference match.')
+MEDICATIONS_EXTRACTED = registry.counter('dili_medications_extracted_total', 'Extracted medications.')
+LOG_RECORDS_DROPPED = registry.counter('dili_log_records_dropped_total', 'Log records dropped because the log queue was full.')
@@ -0,0 +1,84 @@
+import time
+import threading
+
+
+class RateLimiter:
+    """
+    Thread-safe token-bucket limiter for LLM calls, with one bucket for requests per minute
+    and an optional one for tokens per minute.
+
+    Each bucket holds up to BURST_SECONDS worth of its rate. When the provider still answers
+    with a rate-limit error, `on_rate_limited` halves the effective rate and pauses new calls;
+    the rate then climbs back to the configured quota over `recovery_seconds`.
+    """
+
+    BURST_SECONDS = 10
+    MIN_RATE_FACTOR = 0.1
+
+    def __init__(self, requests_per_minute, tokens_per_minute=None, recovery_seconds=60):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.recovery_seconds = recovery_seconds
+        self.rate_factor = 1.0
+        self._lock = threading.Lock()
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._request_tokens = self._capacity(requests_per_minute)
+        self._llm_tokens = self._capacity(tokens_per_minute) if tokens_per_minute else 0.0
+
+    def _capacity(self, per_minute):
+        return max(1.0, per_minute / 60 * self.BURST_SECONDS)
+
+    def _refill(self, now):
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self.rate_factor = min(1.0, self.rate_factor + elapsed / self.recovery_seconds)
+        self._request_tokens = min(self._capacity(self.requests_per_minute),
+                                   self._request_tokens + elapsed * self.requests_per_minute / 60 * self.rate_factor)
+        if self.tokens_per_minute:
+            self._llm_tokens = min(self._capacity(self.tokens_per_minute),
+                                   self._llm_tokens + elapsed * self.tokens_per_minute / 60 * self.rate_factor)
+
+    def acquire(self, tokens=0):
+        """
+        Blocks until one request, estimated to use `tokens` LLM tokens, may be sent.
+
+        Estimates larger than the bucket only wait for a full bucket, so they cannot block forever.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    needed_tokens = min(tokens, self._capacity(self.tokens_per_minute)) if self.tokens_per_minute else 0
+                    wait = max(
+                        (1 - self._request_tokens) * 60 / (self.requests_per_minute * self.rate_factor),
+                        (needed_tokens - self._llm_tokens) * 60 / (self.tokens_per_minute * self.rate_factor)
+                        if self.tokens_per_minute else 0)
+                    if wait <= 0:
+                        self._request_tokens -= 1
+                        self._llm_tokens -= needed_tokens
+                        return
+            time.sleep(wait)
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        """Charges (or refunds) the difference between the estimated and the reported token usage."""
+        if self.tokens_per_minute and actual_tokens is not None:
+            with self._lock:
+                self._llm_tokens -= actual_tokens - estimated_tokens
+
+    def on_rate_limited(self, retry_after=None):
+        """
+        Backs off after the provider rejected a call with a rate-limit error.
+
+        Args:
+            retry_after (float): Seconds the provider asked us to wait, if it said so.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate_factor = max(self.MIN_RATE_FACTOR, self.rate_factor / 2)
+            pause = retry_after if retry_after is not None else 60 / (self.requests_per_minute * self.rate_factor)
+            self._paused_until = max(self._paused_until, now + pause)
+            self._request_tokens = min(self._request_tokens, 0.0)
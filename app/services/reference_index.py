@@ -0,0 +1,257 @@
+import os
+import json
+import mmap
+import struct
+import logging
+from array import array
+
+import pandas as pd
+from config import Config
+from app.services.drug_matcher import DrugMatcher
+from app.services.alias_table import AliasTable, build_alias_table
+
+# File layout: fixed preamble, JSON header, then 8-byte aligned column and index arrays.
+# Bump FORMAT_VERSION whenever the layout or the header keys change.
+MAGIC = b'DILIIDX\n'
+FORMAT_VERSION = 2
+PREAMBLE = struct.Struct('<8sII')  # magic, format version, header length
+
+
+def read_reference_workbooks():
+    """
+    Reads the reference workbooks into DataFrames.
+
+    Returns:
+        dict: Table name -> (source path, DataFrame). The combined table uses the same column
+              names as the rest of the app (see reference_store.COLUMN_RENAMES).
+    """
+    from app.services.reference_store import COLUMN_RENAMES
+
+    combined_df = pd.read_excel(Config.COMBINED_FILE, sheet_name='Sheet1')
+    combined_df.rename(columns=COLUMN_RENAMES, inplace=True)
+    return {
+        'combined': (Config.COMBINED_FILE, combined_df),
+        'dilirank': (Config.DILIRANK_FILE, pd.read_excel(Config.DILIRANK_FILE, sheet_name='DILIrank')),
+        'livertox': (Config.LIVERTOX_FILE, pd.read_excel(Config.LIVERTOX_FILE, sheet_name=0)),
+    }
+
+
+class _Writer:
+    """Accumulates the aligned data section of a snapshot and records where each array lives."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def add(self, payload):
+        self.data.extend(b'\0' * (-len(self.data) % 8))
+        start = len(self.data)
+        self.data.extend(payload)
+        return [start, len(payload)]
+
+    def add_strings(self, values):
+        """Stores a list of strings (None allowed) as an offsets array plus a UTF-8 blob."""
+        blob = bytearray()
+        offsets = array('Q', [0])
+        nulls = []
+        for row, value in enumerate(values):
+            if value is None:
+                nulls.append(row)
+            else:
+                blob.extend(value.encode('utf-8'))
+            offsets.append(len(blob))
+        return {'offsets': self.add(offsets.tobytes()), 'data': self.add(blob), 'nulls': nulls}
+
+
+def _column_kind(series):
+    if pd.api.types.is_integer_dtype(series):
+        return 'int'
+    if pd.api.types.is_float_dtype(series):
+        return 'float'
+    return 'str'
+
+
+def build_reference_index(output_path=None):
+    """
+    Compiles the reference workbooks into a versioned, memory-mappable snapshot.
+
+    The snapshot holds every column of Combined.xlsx, DILIrank.xlsx and LiverTox.xlsx, the
+    normalized (lowercased) combined drug names, the DrugMatcher bigram index over them and the
+    alias table merged from the three workbooks (see alias_table.build_alias_table).
+    It is written to a temporary file and moved into place, so processes that still have
+    the previous snapshot mapped keep reading a consistent copy.
+
+    Args:
+        output_path (str): Where to write the snapshot (default: Config.REFERENCE_INDEX_FILE).
+
+    Returns:
+        str: The path of the written snapshot.
+    """
+    output_path = output_path or Config.REFERENCE_INDEX_FILE
+    writer = _Writer()
+    header = {'sources': {}, 'tables': {}}
+
+    workbooks = read_reference_workbooks()
+    for table_name, (source_path, df) in workbooks.items():
+        stat = os.stat(source_path)
+        header['sources'][table_name] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+        columns = []
+        for column in df.columns:
+            values = [None if pd.isna(value) else str(value) for value in df[column]]
+            columns.append({'name': str(column), 'kind': _column_kind(df[column]), **writer.add_strings(values)})
+        header['tables'][table_name] = {'rows': len(df), 'columns': columns}
+
+    # Normalized names and the match index are only needed for the combined table
+    names = [str(name).lower() for name in workbooks['combined'][1]['Drug']]
+    header['names'] = writer.add_strings(names)
+    grams = []
+    for gram, (indices, counts) in DrugMatcher(names).postings.items():
+        grams.append([gram, writer.add(array('I', indices).tobytes()), writer.add(array('I', counts).tobytes())])
+    header['postings'] = grams
+
+    aliases = build_alias_table(names, workbooks['dilirank'][1].to_dict('records'),
+                                workbooks['livertox'][1].to_dict('records'))
+    alias_items = list(aliases.items())
+    header['aliases'] = {
+        'names': writer.add_strings([alias for alias, _ in alias_items]),
+        'rows': writer.add(array('I', [row for _, (row, _, _) in alias_items]).tobytes()),
+        'sources': writer.add_strings([source for _, (_, source, _) in alias_items]),
+        'kinds': writer.add_strings([kind for _, (_, _, kind) in alias_items]),
+    }
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    preamble = PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes))
+    padding = b'\0' * (-(len(preamble) + len(header_bytes)) % 8)
+
+    temp_path = output_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(preamble)
+        f.write(header_bytes)
+        f.write(padding)
+        f.write(writer.data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, output_path)
+    logging.info(f"Wrote reference index snapshot to {output_path} ({len(names)} combined drugs, "
+                 f"{len(aliases)} aliases).")
+    return output_path
+
+
+class ColumnarTable:
+    """
+    Row access over one table of a snapshot. Values are decoded from the mapped file on
+    demand, so nothing but the column offsets is held per process.
+    """
+
+    def __init__(self, index, spec):
+        self._rows = spec['rows']
+        self._columns = [(column['name'], column['kind'], index._strings(column)) for column in spec['columns']]
+        self.columns = [name for name, _, _ in self._columns]
+
+    def __len__(self):
+        return self._rows
+
+    def __getitem__(self, row):
+        if not 0 <= row < self._rows:
+            raise IndexError(row)
+        record = {}
+        for name, kind, strings in self._columns:
+            value = strings[row]
+            if value is not None and kind != 'str':
+                value = int(value) if kind == 'int' else float(value)
+            record[name] = value
+        return record
+
+
+class _Strings:
+    """Lazily decoded string column backed by an offsets array and a UTF-8 blob."""
+
+    def __init__(self, offsets, data, nulls):
+        self._offsets = offsets
+        self._data = data
+        self._nulls = frozenset(nulls)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row):
+        if row in self._nulls:
+            return None
+        return str(self._data[self._offsets[row]:self._offsets[row + 1]], 'utf-8')
+
+
+class ReferenceIndex:
+    """
+    A reference index snapshot opened read-only through mmap.
+
+    Worker processes that open the same snapshot share its pages through the OS page cache
+    instead of each holding a private DataFrame.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a reference index snapshot of format version {FORMAT_VERSION}")
+        header_end = PREAMBLE.size + header_length
+        self.header = json.loads(self._mmap[PREAMBLE.size:header_end])
+        self._data = memoryview(self._mmap)[header_end + (-header_end % 8):]
+        self.path = path
+
+    def _array(self, location, typecode):
+        start, length = location
+        return self._data[start:start + length].cast(typecode)
+
+    def _strings(self, spec):
+        start, length = spec['data']
+        return _Strings(self._array(spec['offsets'], 'Q'), self._data[start:start + length], spec['nulls'])
+
+    def is_stale(self, table_name, source_path):
+        """
+        Checks whether a table was compiled from a different version of its source workbook.
+        A missing workbook is not considered stale, so the snapshot can be deployed on its own.
+        """
+        try:
+            stat = os.stat(source_path)
+        except FileNotFoundError:
+            return False
+        recorded = self.header['sources'][table_name]
+        return (stat.st_mtime_ns, stat.st_size) != (recorded['mtime_ns'], recorded['size'])
+
+    def table(self, table_name):
+        return ColumnarTable(self, self.header['tables'][table_name])
+
+    def names(self):
+        """Returns the normalized combined drug names, in row order."""
+        strings = self._strings(self.header['names'])
+        return [strings[row] for row in range(len(strings))]
+
+    def aliases(self):
+        """Returns the alias table compiled into the snapshot."""
+        spec = self.header['aliases']
+        names = self._strings(spec['names'])
+        rows = self._array(spec['rows'], 'I')
+        sources = self._strings(spec['sources'])
+        kinds = self._strings(spec['kinds'])
+        return AliasTable({names[i]: (rows[i], sources[i], kinds[i]) for i in range(len(names))})
+
+    def postings(self):
+        """Returns the precomputed DrugMatcher bigram index, backed by the mapped file."""
+        return {gram: (self._array(indices, 'I'), self._array(counts, 'I')) for gram, indices, counts in self.header['postings']}
+
+
+def open_reference_index(path=None):
+    """
+    Opens the reference index snapshot.
+
+    Returns:
+        ReferenceIndex: The opened snapshot, or None if it is missing or has an incompatible format.
+    """
+    path = path or Config.REFERENCE_INDEX_FILE
+    try:
+        return ReferenceIndex(path)
+    except FileNotFoundError:
+        return None
+    except (ValueError, struct.error) as e:
+        logging.warning(f"Ignoring unreadable reference index {path}: {e}")
+        return None
@@ -0,0 +1,206 @@
+import os
+import time
+import logging
+import threading
+from types import MappingProxyType
+
+import pandas as pd
+from config import Config
+from app.services.drug_matcher import DrugMatcher
+from app.services.alias_table import build_alias_table
+from app.services.reference_index import open_reference_index
+
+# Column names in Combined.xlsx mapped to the keys used throughout the app
+COLUMN_RENAMES = {
+    'Drug Name': 'Drug',  # Keep this if your column is still named 'Drug Name'
+    'vDILIConcern': 'DILI_Likelihood',
+    'Livertox Score': 'LiverTox_LikelihoodScore'  # Match the exact column name
+}
+
+
+class ReferenceTable:
+    """
+    Read-only view of the combined DILI reference sheet.
+
+    Records are read-only mappings (or rows of a memory-mapped snapshot) so a table can be
+    shared between threads without copying; callers receive a fresh dict from `record()`.
+    The alias table and the fuzzy-match index over the drug names are built together with the
+    table and swapped with it on reload.
+    """
+
+    def __init__(self, records, source, version, names=None, matcher=None, aliases=None):
+        self._records = records
+        self.names = tuple(str(record['Drug']).lower() for record in records) if names is None else tuple(names)
+        self.matcher = DrugMatcher(self.names) if matcher is None else matcher
+        self.aliases = build_alias_table(self.names) if aliases is None else aliases
+        self.source = source
+        self.version = version
+
+    def __len__(self):
+        return len(self._records)
+
+    def record(self, index):
+        """Returns a mutable copy of the record at the given row index."""
+        return dict(self._records[index])
+
+    def match_many(self, names):
+        """
+        Finds the reference row of each lowercased name: an exact alias lookup first (generic,
+        salt-stripped or brand name, see alias_table.py), fuzzy matching only for the rest.
+
+        Returns:
+            list: One (index, score, alias) tuple per name. `index` and `score` are None if there is no match;
+                  `alias` is the (row, source, kind) alias entry for alias hits, None otherwise.
+        """
+        results = [None] * len(names)
+        fuzzy = []
+        for position, name in enumerate(names):
+            alias = self.aliases.lookup(name)
+            if alias is None:
+                fuzzy.append(position)
+            else:
+                results[position] = (alias[0], 100, alias)
+        for position, (index, score) in zip(fuzzy, self.matcher.match_many([names[position] for position in fuzzy])):
+            results[position] = (index, score, None)
+        return results
+
+
+def _file_version(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _alias_sources():
+    """Snapshot table name -> path of the workbooks the alias table is built from."""
+    return {'dilirank': Config.DILIRANK_FILE, 'livertox': Config.LIVERTOX_FILE}
+
+
+def source_version(path, index_path):
+    """Returns the (workbook, snapshot, DILIrank, LiverTox) mtimes a loaded table is valid for."""
+    return (_file_version(path), _file_version(index_path),
+            *(_file_version(source_path) for source_path in _alias_sources().values()))
+
+
+def _read_alias_records(source_path, sheet_name):
+    """Reads an alias source workbook into records; an absent workbook contributes no aliases."""
+    try:
+        return pd.read_excel(source_path, sheet_name=sheet_name).to_dict('records')
+    except FileNotFoundError:
+        logging.warning(f"Alias source not found: {source_path}")
+        return []
+
+
+def load_reference_table(path, index_path=None):
+    """
+    Loads the combined reference data into a ReferenceTable.
+
+    The compiled snapshot (see build_index.py) is used when it is present and was built from
+    the current workbook; otherwise the workbook itself is parsed.
+
+    Args:
+        path (str): Path to Combined.xlsx.
+        index_path (str): Path to the reference index snapshot (default: Config.REFERENCE_INDEX_FILE).
+
+    Returns:
+        ReferenceTable: The loaded reference data.
+    """
+    index_path = index_path or Config.REFERENCE_INDEX_FILE
+    version = source_version(path, index_path)
+
+    index = open_reference_index(index_path)
+    stale = None
+    if index is not None:
+        sources = {'combined': path, **_alias_sources()}
+        stale = [source_path for table_name, source_path in sources.items() if index.is_stale(table_name, source_path)]
+    if index is not None and not stale:
+        names = index.names()
+        table = ReferenceTable(index.table('combined'), source=index_path, version=version, names=names,
+                               matcher=DrugMatcher(names, postings=index.postings()), aliases=index.aliases())
+        logging.info(f"Loaded combined DILI data from snapshot: {index_path} ({len(table)} rows, "
+                     f"{len(table.aliases)} aliases).")
+        return table
+    if index is not None:
+        logging.warning(f"Reference index {index_path} is out of date with {', '.join(stale)}; "
+                        f"run build_index.py to rebuild it.")
+
+    if version[0] is None:
+        raise FileNotFoundError(path)
+    logging.info(f"Loading combined DILI data from: {path}, Sheet: 'Sheet1'")
+    combined_df = pd.read_excel(path, sheet_name='Sheet1')
+    combined_df.rename(columns=COLUMN_RENAMES, inplace=True)
+    records = tuple(MappingProxyType(record) for record in combined_df.to_dict('records'))
+    names = [str(record['Drug']).lower() for record in records]
+    aliases = build_alias_table(names, _read_alias_records(Config.DILIRANK_FILE, 'DILIrank'),
+                                _read_alias_records(Config.LIVERTOX_FILE, 0))
+    table = ReferenceTable(records, source=path, version=version, names=names, aliases=aliases)
+    logging.info(f"Successfully loaded combined DILI data ({len(table)} rows, {len(aliases)} aliases).")
+    return table
+
+
+class ReferenceStore:
+    """
+    Process-wide holder for the current ReferenceTable.
+
+    The table is loaded once and swapped for a new one when the mtime of the source workbook,
+    of its compiled snapshot or of the alias workbooks changes. The mtimes are checked at most once every
+    `reload_interval` seconds, so lookups normally only read an attribute and never touch
+    the disk.
+    """
+
+    def __init__(self, path, index_path=None, reload_interval=None):
+        self.path = path
+        self.index_path = index_path or Config.REFERENCE_INDEX_FILE
+        self.reload_interval = Config.REFERENCE_RELOAD_INTERVAL if reload_interval is None else reload_interval
+        self._table = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Returns the current reference table, reloading it first if the source file changed.
+
+        Raises:
+            FileNotFoundError: If no table has been loaded yet and neither the workbook nor
+                               its snapshot exists.
+        """
+        table = self._table
+        if table is not None and time.monotonic() < self._next_check:
+            return table
+        # Only one thread checks/reloads; the others keep using the current table meanwhile
+        if not self._lock.acquire(blocking=table is None):
+            return table
+        try:
+            return self._refresh()
+        finally:
+            self._lock.release()
+
+    def _refresh(self):
+        table = self._table
+        if table is not None and time.monotonic() < self._next_check:
+            return table
+        try:
+            if table is None or source_version(self.path, self.index_path) != table.version:
+                table = load_reference_table(self.path, self.index_path)
+                self._table = table  # Atomic swap; readers holding the old table are unaffected
+        except Exception as e:
+            if table is None:
+                raise
+            logging.error(f"Failed to reload DILI reference data from {self.path}, keeping previous copy: {e}")
+        self._next_check = time.monotonic() + self.reload_interval
+        return table
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_reference_store():
+    """Returns the process-wide ReferenceStore for Config.COMBINED_FILE."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ReferenceStore(Config.COMBINED_FILE)
+    return _store
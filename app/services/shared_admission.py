@@ -0,0 +1,110 @@
+import os
+import time
+import sqlite3
+import threading
+
+from config import Config
+
+# Connections a forked child inherited; kept referenced rather than closed, because closing one
+# would drop the SQLite file locks held by the child's own connection
+_inherited_connections = []
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # Exists, owned by another user
+        return True
+    return True
+
+
+class SharedAdmission:
+    """
+    Admission slots shared by all worker processes of a node through a SQLite file, so an
+    in-flight limit holds for the workers together instead of for each of them.
+
+    Every admitted request holds one row until it is released. Rows left behind by workers that
+    died (or requests older than `stale_after` seconds) are reclaimed when a queue looks full.
+    Each process opens its own connection on first use, so the object may be created before a fork.
+    """
+
+    def __init__(self, path, stale_after=None):
+        self.path = path
+        self.stale_after = 2 * Config.REQUEST_TIMEOUT if stale_after is None else stale_after
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+
+    @property
+    def db(self):
+        if self._pid != os.getpid():
+            if self._db is not None:
+                _inherited_connections.append(self._db)
+            self._db = self._connect()
+            self._pid = os.getpid()
+        return self._db
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS admissions ("
+            "id INTEGER PRIMARY KEY, queue TEXT NOT NULL, pid INTEGER NOT NULL, admitted_at REAL NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS admissions_queue ON admissions (queue)")
+        # Rows of an earlier process that had this pid
+        db.execute("DELETE FROM admissions WHERE pid = ?", (os.getpid(),))
+        return db
+
+    def try_acquire(self, queue, limit):
+        """
+        Takes a slot of `queue` if fewer than `limit` are taken node-wide.
+
+        Returns:
+            int: The slot to pass to release, or None if the queue is full.
+
+        Raises:
+            sqlite3.Error: If the state file cannot be used.
+        """
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                if self._count(queue) >= limit and (not self._reclaim(queue) or self._count(queue) >= limit):
+                    return None
+                cursor = self.db.execute("INSERT INTO admissions (queue, pid, admitted_at) VALUES (?, ?, ?)",
+                                         (queue, os.getpid(), time.time()))
+                return cursor.lastrowid
+            finally:
+                self.db.execute("COMMIT")
+
+    def release(self, slot):
+        """Gives back a slot taken by try_acquire."""
+        with self._lock:
+            self.db.execute("DELETE FROM admissions WHERE id = ?", (slot,))
+
+    def in_flight(self, queue):
+        """Returns the number of slots of `queue` taken node-wide."""
+        with self._lock:
+            return self._count(queue)
+
+    def _count(self, queue):
+        return self.db.execute("SELECT COUNT(*) FROM admissions WHERE queue = ?", (queue,)).fetchone()[0]
+
+    def _reclaim(self, queue):
+        """Deletes the slots of dead processes and expired requests; returns whether any were freed."""
+        rows = self.db.execute("SELECT id, pid, admitted_at FROM admissions WHERE queue = ?", (queue,)).fetchall()
+        cutoff = time.time() - self.stale_after
+        alive = {}
+        stale = []
+        for slot, pid, admitted_at in rows:
+            if pid not in alive:
+                alive[pid] = _pid_alive(pid)
+            if not alive[pid] or admitted_at < cutoff:
+                stale.append((slot,))
+        self.db.executemany("DELETE FROM admissions WHERE id = ?", stale)
+        return bool(stale)
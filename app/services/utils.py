@@ -1,5 +1,15 @@
 import re
 
+# Salt, ester and hydrate words that follow the active ingredient in structured drug lists
+# (e.g. "METFORMIN HYDROCHLORIDE", "WARFARIN SODIUM"); stripped from the end of a name.
+SALT_SUFFIXES = frozenset([
+    'acetate', 'anhydrous', 'benzoate', 'besylate', 'bitartrate', 'bromide', 'calcium', 'citrate',
+    'cypionate', 'decanoate', 'dihydrate', 'dihydrochloride', 'dipropionate', 'disodium', 'enanthate',
+    'fumarate', 'gluconate', 'hcl', 'hyclate', 'hydrobromide', 'hydrochloride', 'lactate', 'magnesium',
+    'maleate', 'malate', 'mesylate', 'monohydrate', 'napsylate', 'nitrate', 'phosphate', 'potassium',
+    'propionate', 'sodium', 'succinate', 'sulfate', 'tartrate', 'tosylate', 'trihydrate', 'valerate',
+])
+
 def contains_drug_names(text):
     """
     Checks if the given text contains potential drug names using a more comprehensive approach.
@@ -74,4 +84,11 @@ def clean_and_split_drug_names(drug_string, delimiters=r"[,;+/]"):
     drug_names = re.split(delimiters, drug_string)
     # Clean each drug name
     cleaned_drug_names = [name.strip().lower() for name in drug_names if name.strip()]
-    return cleaned_drug_names
\ No newline at end of file
+    return cleaned_drug_names
+
+def strip_salt_suffixes(name):
+    """Removes trailing salt/ester words, e.g. 'verapamil hydrochloride' -> 'verapamil'."""
+    words = name.split()
+    while len(words) > 1 and words[-1] in SALT_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import httpx
+
+from config import Config
+from fake_llm_server import start_fake_llm_server
+
+# Quota passed to the NHANES pipeline so its rate limiter never throttles a benchmark run
+UNLIMITED_QUOTA = 10 ** 9
+
+
+def configure_llm(args):
+    """
+    Points the extractor at the fake LLM server (started here unless --llm-url is given) and
+    turns off what would distort the numbers: the fixed pre-call delay and, unless --cache,
+    the extraction cache.
+
+    Returns:
+        FakeLLMServer: The started server, or None when --llm-url is used.
+    """
+    server = None
+    if args.llm_url:
+        Config.LLM_BASE_URL = args.llm_url
+    else:
+        server = start_fake_llm_server(latency=args.latency, latency_dist=args.latency_dist,
+                                       record_latency=args.record_latency, error_rate=args.error_rate,
+                                       rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+                                       seed=args.seed)
+        Config.LLM_BASE_URL = server.url
+    Config.LLM_API_KEY = Config.LLM_API_KEY or 'fake-key'
+    Config.MODEL = Config.MODEL or 'fake-model'
+    Config.BACKUP_MODEL = Config.BACKUP_MODEL or 'fake-backup-model'
+    Config.LLM_CALL_DELAY = args.call_delay
+    Config.EXTRACTION_CACHE_ENABLED = args.cache
+    return server
+
+
+def latency_summary(latencies):
+    """Returns count and p50/p95/p99/max latency in milliseconds."""
+    if not latencies:
+        return {'count': 0}
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {'count': len(latencies), 'p50_ms': round(p50, 1), 'p95_ms': round(p95, 1),
+            'p99_ms': round(p99, 1), 'max_ms': round(max(latencies) * 1000, 1)}
+
+
+def load_inputs(input_file, limit=None):
+    """Returns the drug_concat values of an NHANES-style CSV as request inputs."""
+    inputs = pd.read_csv(input_file)['drug_concat'].map(str).tolist()
+    return inputs[:limit] if limit else inputs
+
+
+def benchmark_api(args):
+    """
+    Serves the Flask app on a local port and posts --requests inputs to /api/process_medications
+    with --concurrency clients.
+    """
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    app = create_app()
+    http_server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, name='benchmark-api', daemon=True).start()
+    url = f"http://127.0.0.1:{http_server.server_port}/api/process_medications"
+
+    inputs = load_inputs(args.input)
+    payloads = [{'user_input': inputs[i % len(inputs)], 'model': Config.MODEL, 'extraction_mode': args.extractor}
+                for i in range(args.requests)]
+    client = httpx.Client(limits=httpx.Limits(max_connections=args.concurrency), timeout=Config.REQUEST_TIMEOUT + 10)
+
+    def post(payload):
+        started = time.perf_counter()
+        try:
+            status = client.post(url, json=payload).status_code
+        except httpx.HTTPError:
+            status = 'error'
+        return status, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(post, payloads))
+    elapsed = time.perf_counter() - started
+    client.close()
+    http_server.shutdown()
+
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'benchmark': 'api',
+        'requests': len(results),
+        'concurrency': args.concurrency,
+        'statuses': statuses,
+        'seconds': round(elapsed, 3),
+        'requests_per_sec': round(len(results) / elapsed, 2),
+        'latency': latency_summary([latency for status, latency in results if status == 200]),
+    }
+
+
+def benchmark_nhanes(args):
+    """Runs process_nhanes_data on --input (output to a temporary file) and times it."""
+    from process_nhanes import process_nhanes_data
+    from app.services.logging_config import setup_logging
+
+    setup_logging()
+
+    rows = len(pd.read_csv(args.input))
+    with tempfile.TemporaryDirectory() as output_dir:
+        started = time.perf_counter()
+        process_nhanes_data(args.input, os.path.join(output_dir, 'nhanes_dili_risk.csv'),
+                            concurrency=args.concurrency, requests_per_minute=UNLIMITED_QUOTA,
+                            tokens_per_minute=UNLIMITED_QUOTA, use_cache=args.cache,
+                            chunk_size=args.chunk_size, batch_size=args.batch_size, mode=args.extractor)
+        elapsed = time.perf_counter() - started
+    return {
+        'benchmark': 'nhanes',
+        'rows': rows,
+        'concurrency': args.concurrency,
+        'batch_size': args.batch_size,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(rows / elapsed, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput and latency benchmarks against a local fake LLM server.")
+    parser.add_argument('target', choices=['api', 'nhanes'],
+                        help="api: load the Flask endpoint; nhanes: run the NHANES pipeline")
+    parser.add_argument('--input', default=Config.NHANES_INPUT_FILE, help="CSV with a drug_concat column")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent API clients or NHANES calls")
+    parser.add_argument('--requests', type=int, default=200, help="Requests sent by the api benchmark")
+    parser.add_argument('--batch-size', type=int, default=None, help="NHANES --batch-size")
+    parser.add_argument('--chunk-size', type=int, default=None, help="NHANES --chunk-size")
+    parser.add_argument('--extractor', choices=['llm', 'local', 'hybrid'], default='llm')
+    parser.add_argument('--cache', action='store_true', help="Use the extraction cache (off by default)")
+    parser.add_argument('--call-delay', type=float, default=0.0,
+                        help="Config.LLM_CALL_DELAY during the run (the app default is 2 seconds)")
+    parser.add_argument('--llm-url', help="Use an already running LLM endpoint instead of starting the fake server")
+    parser.add_argument('--latency', type=float, default=0.2, help="Fake server median latency (seconds)")
+    parser.add_argument('--latency-dist', choices=['fixed', 'uniform', 'lognormal'], default='lognormal')
+    parser.add_argument('--record-latency', type=float, default=0.01, help="Fake server seconds per batched record")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fake server 500 rate")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fake server 429 rate")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="Fake server retry-after")
+    parser.add_argument('--seed', type=int, default=0, help="Fake server random seed")
+    parser.add_argument('--json', help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    server = configure_llm(args)
+    report = benchmark_api(args) if args.target == 'api' else benchmark_nhanes(args)
+    if server is not None:
+        report['llm_server'] = dict(server.stats)
+        server.shutdown()
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
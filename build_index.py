@@ -0,0 +1,16 @@
+import argparse
+from app.services.reference_index import build_reference_index
+from app.services.logging_config import setup_logging
+from config import Config
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog='build-index',
+        description="Compile Combined.xlsx, DILIrank.xlsx and LiverTox.xlsx into the reference index snapshot.")
+    parser.add_argument('--output', default=Config.REFERENCE_INDEX_FILE,
+                        help=f"Snapshot path (default: {Config.REFERENCE_INDEX_FILE})")
+    args = parser.parse_args()
+    setup_logging()
+
+    output_path = build_reference_index(args.output)
+    print(f"Reference index written to {output_path}")
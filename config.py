@@ -6,9 +6,64 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class Config:
-    LLM_API_KEY = ''
+    LLM_API_KEY = os.environ.get('LLM_API_KEY', '')
+    LLM_BASE_URL = os.environ.get('LLM_BASE_URL', '')  # Empty = the provider's default endpoint
     MODEL = ''
     BACKUP_MODEL = ''
-    COMBINED_FILE = os.path.join('data', 'combined.xlsx')
+    COMBINED_FILE = os.path.join('data', 'Combined.xlsx')
+    DILIRANK_FILE = os.path.join('data', 'DILIrank.xlsx')
+    LIVERTOX_FILE = os.path.join('data', 'LiverTox.xlsx')
+    REFERENCE_INDEX_FILE = os.path.join('data', 'reference.idx')  # Built by build_index.py
+    REFERENCE_RELOAD_INTERVAL = 5  # Seconds between checks for updated reference files
+    MATCH_THRESHOLD = 85  # Minimum fuzz.ratio score for a reference drug match
+    EXTRACTION_MODE = 'llm'  # 'llm', 'local' (reference data only) or 'hybrid' (local first, LLM for the rest)
+    LOCAL_MATCH_THRESHOLD = 95  # Minimum fuzz.ratio score to resolve a drug locally
+    EXTRACTION_CACHE_ENABLED = os.environ.get('EXTRACTION_CACHE_ENABLED', '1') != '0'  # Set to 0 for evaluation runs
+    EXTRACTION_CACHE_FILE = os.path.join('data', 'extraction_cache.sqlite3')
+    EXTRACTION_CACHE_MEMORY_SIZE = 4096  # Entries kept in the in-process LRU
+    EXTRACTION_CACHE_MAX_ENTRIES = 200000  # Entries kept in the SQLite file
+    EXTRACTION_CACHE_TTL = 30 * 24 * 3600  # Seconds
+    LLM_REQUESTS_PER_MINUTE = 30  # API quota used to pace concurrent NHANES runs
+    LLM_TOKENS_PER_MINUTE = 6000
+    LLM_CALL_DELAY = 2  # Seconds slept before each LLM call that is not paced by a rate limiter
+    LLM_MAX_RETRIES = 3  # Retries of a failed LLM call (429, 5xx, connection errors)
+    LLM_BACKOFF_BASE = 1.0  # Seconds; backoff doubles per retry, with full jitter
+    LLM_BACKOFF_MAX = 30.0
+    LLM_BREAKER_FAILURES = 5  # Consecutive failures that open a model's circuit breaker
+    LLM_BREAKER_RESET_TIMEOUT = 30  # Seconds before an open circuit lets a trial call through
+    LLM_MAX_CONNECTIONS = 20  # Pooled keep-alive connections to the LLM API
+    LLM_KEEPALIVE_EXPIRY = 60  # Seconds an idle pooled connection is kept
+    LLM_TIMEOUT = 60  # Seconds per LLM HTTP request
+    NHANES_CONCURRENCY = 1  # Extraction calls in flight in process_nhanes.py (1 = serial)
+    BATCH_TOKEN_BUDGET = 4000  # Estimated tokens per batched extraction request
+    BATCH_MAX_RECORDS = 25  # Records per batched extraction request
+    BATCH_RETRIES = 1  # Times records that failed to parse are re-issued
+    DISPATCHER_WORKERS = 4  # Worker threads per model in the API
+    DISPATCHER_MAX_IN_FLIGHT = 10  # Admitted (queued + running) API requests per model
+    REQUEST_TIMEOUT = 120  # Seconds an API request waits for its result
+    # Set SHARED_ADMISSION=1 when several worker processes serve the API (see gunicorn.conf.py), so
+    # DISPATCHER_MAX_IN_FLIGHT applies to all of them together through WORKER_STATE_FILE
+    SHARED_ADMISSION = os.environ.get('SHARED_ADMISSION', '0') == '1'
+    WORKER_STATE_FILE = os.path.join('data', 'worker_state.sqlite3')
+    # Set HEDGE_ENABLED=1 to also send a /api/process_medications request to BACKUP_MODEL when MODEL
+    # has not answered within the HEDGE_PERCENTILE latency of recent requests; the first valid result wins
+    HEDGE_ENABLED = os.environ.get('HEDGE_ENABLED', '0') == '1'
+    HEDGE_PERCENTILE = 95
+    HEDGE_MIN_DELAY = 1.0  # Seconds; also the delay until HEDGE_MIN_SAMPLES latencies are known
+    HEDGE_MIN_SAMPLES = 20
+    HEDGE_BUDGET_RATIO = 0.05  # Hedged requests per request, in the long run
+    HEDGE_BUDGET_BURST = 10  # Hedged requests that may be sent back to back
+    BATCH_REQUEST_MAX_ITEMS = 1000  # Inputs accepted by /api/process_medications/batch
+    BATCH_REQUEST_MAX_IN_FLIGHT = 4  # Dispatcher slots one batch request may hold at a time
+    LOG_FILE = os.environ.get('LOG_FILE', 'app.log')
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # 'json' (one object per line) or 'text'
+    LOG_QUEUE_SIZE = 10000  # Records waiting for the background log writer; more are dropped
+    LOG_SAMPLE_RATES = {  # Fraction of high-volume records kept, by the `sample` key of the call
+        'user_input': 0.1,
+        'llm_response': 0.1,
+        'drug_match': 0.1,
+        'unmatched_drug': 0.1,
+    }
     NHANES_INPUT_FILE = 'data/nhanes.csv'
     OUTPUT_FILE = 'data/nhanes_dili_risk.csv'
@@ -0,0 +1,84 @@
+import json
+import time
+import logging
+import argparse
+
+import pandas as pd
+
+from config import Config
+from app.services.evaluation import build_evaluation_tables, metrics_by_threshold, metrics_by_drug
+from app.services.logging_config import setup_logging
+
+
+def load_extractions(extractions_file):
+    """
+    Reads extractions saved by process_nhanes.py --save-extractions.
+
+    Returns:
+        dict: drug_concat string -> medication list (None for failed extractions). Later lines win,
+              so files appended to by resumed runs can be read as they are.
+    """
+    extractions = {}
+    with open(extractions_file, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                extractions[record['drug_concat']] = record['medications']
+    return extractions
+
+
+def evaluate(input_file, extractions_file, thresholds, threshold, per_drug_output=None):
+    """
+    Scores saved extractions against the drug_concat column of the input file, without calling the LLM.
+
+    Args:
+        input_file (str): NHANES CSV with a drug_concat column (rows are weighted like process_nhanes.py).
+        extractions_file (str): JSON lines file written by process_nhanes.py --save-extractions.
+        thresholds (list): Match thresholds to report precision/recall/F1 for.
+        threshold (int): Threshold of the per-drug report.
+        per_drug_output (str): Optional CSV path for the full per-drug table.
+
+    Returns:
+        dict: Summary with rows/sec and the per-threshold metrics.
+    """
+    input_counts = pd.read_csv(input_file)['drug_concat'].map(str).value_counts(sort=False)
+    extractions = load_extractions(extractions_file)
+    rows = int(input_counts.sum())
+
+    started = time.perf_counter()
+    extracted, expected = build_evaluation_tables(input_counts, extractions)
+    by_threshold = metrics_by_threshold(extracted, expected, thresholds)
+    by_drug = metrics_by_drug(extracted, expected, threshold)
+    elapsed = time.perf_counter() - started
+
+    evaluated_rows = int(input_counts[[bool(extractions.get(drug_concat)) for drug_concat in input_counts.index]].sum())
+    if per_drug_output:
+        by_drug.to_csv(per_drug_output, index_label='drug')
+
+    pd.set_option('display.width', 160)
+    print(f"Rows: {rows} ({evaluated_rows} with extractions, {len(input_counts)} distinct inputs)")
+    print(f"Evaluated in {elapsed:.3f}s ({rows / elapsed if elapsed else float('inf'):.0f} rows/sec)\n")
+    print("By threshold:")
+    print(by_threshold.to_string(index=False, float_format='%.3f'))
+    print(f"\nBy drug (threshold {threshold}, most expected first):")
+    print(by_drug.head(25).to_string(float_format='%.3f'))
+
+    logging.info(f"Evaluated {extractions_file} against {input_file}: {rows} rows in {elapsed:.3f}s")
+    return {'rows': rows, 'evaluated_rows': evaluated_rows, 'seconds': elapsed,
+            'by_threshold': by_threshold.to_dict(orient='records')}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate saved medication extractions against NHANES drug_concat "
+                                                 "(precision/recall/F1 per threshold and per drug).")
+    parser.add_argument('extractions', help="JSON lines file from process_nhanes.py --save-extractions")
+    parser.add_argument('--input', default=Config.NHANES_INPUT_FILE, help="Input CSV with a drug_concat column")
+    parser.add_argument('--thresholds', default='70,75,80,85,90,95,100',
+                        help="Comma-separated match thresholds to report")
+    parser.add_argument('--threshold', type=int, default=85, help="Threshold of the per-drug report")
+    parser.add_argument('--per-drug-output', default=None, help="Write the full per-drug table to this CSV")
+    args = parser.parse_args()
+    setup_logging()
+
+    evaluate(args.input, args.extractions, [int(value) for value in args.thresholds.split(',')], args.threshold,
+             args.per_drug_output)
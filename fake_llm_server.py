@@ -0,0 +1,251 @@
+import re
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.services.utils import clean_and_split_drug_names
+
+# Same layout as the user prompts built in medication_extractor.py
+SINGLE_PROMPT_PATTERN = re.compile(r"Unstructured Text:\s*(.*?)\s*JSON Output:", re.DOTALL)
+BATCH_PROMPT_PATTERN = re.compile(r"Records:\s*(\{.*\})\s*JSON Output:", re.DOTALL)
+
+# Characters of content per generated (streamed) chunk
+STREAM_CHUNK_CHARS = 16
+
+
+def fake_medications(text, responses=None):
+    """
+    Returns the canned extraction of one input: the entry of `responses` for the text if there
+    is one, otherwise one medication per delimited drug name in the text.
+    """
+    if responses is not None and text in responses:
+        return responses[text]
+    return [{'name': name, 'normalized_name': name, 'dosage': None, 'frequency': None, 'date': None}
+            for name in clean_and_split_drug_names(text) if name not in ('', 'nan', 'none')]
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """
+    A local stand-in for the Groq chat completions API, for load tests and benchmarks.
+
+    Answers every POST to .../chat/completions after a simulated latency with canned JSON in the
+    format the extraction prompts ask for, both for single and for batched prompts, as one response
+    or, for stream=true requests, as server-sent completion chunks. Server errors, 429s (with
+    retry-after) and malformed JSON can be injected at configurable rates.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.5, latency_dist='fixed', latency_sigma=0.5, record_latency=0.0,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=1.0, malformed_rate=0.0,
+                 responses=None, seed=None, token_delay=0.0):
+        """
+        Args:
+            address (tuple): (host, port) to listen on; port 0 picks a free port.
+            latency (float): Median seconds per request (until the first streamed chunk).
+            latency_dist (str): 'fixed', 'uniform' (0 to 2 * latency) or 'lognormal'.
+            latency_sigma (float): Shape of the lognormal distribution.
+            record_latency (float): Extra seconds per record of a batched prompt.
+            error_rate (float): Fraction of requests answered with HTTP 500.
+            rate_limit_rate (float): Fraction of requests answered with HTTP 429.
+            retry_after (float): retry-after header sent with the 429s.
+            malformed_rate (float): Fraction of requests answered with content that is not JSON.
+            responses (dict): Input text -> canned medication list.
+            seed (int): Seed for the latency and error draws.
+            token_delay (float): Seconds to generate each STREAM_CHUNK_CHARS characters of content,
+                                 spent between streamed chunks or before a whole response.
+        """
+        super().__init__(address, FakeLLMRequestHandler)
+        self.latency = latency
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.record_latency = record_latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.malformed_rate = malformed_rate
+        self.responses = responses
+        self.token_delay = token_delay
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'records': 0, 'errors': 0, 'rate_limited': 0, 'malformed': 0}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def draw(self, records):
+        """Returns (outcome, delay) for a request with `records` inputs."""
+        with self._lock:
+            if self.latency_dist == 'uniform':
+                delay = self._random.uniform(0, 2 * self.latency)
+            elif self.latency_dist == 'lognormal':
+                delay = self.latency * self._random.lognormvariate(0, self.latency_sigma)
+            else:
+                delay = self.latency
+            roll = self._random.random()
+            if roll < self.error_rate:
+                outcome = 'errors'
+            elif roll < self.error_rate + self.rate_limit_rate:
+                outcome = 'rate_limited'
+            elif roll < self.error_rate + self.rate_limit_rate + self.malformed_rate:
+                outcome = 'malformed'
+            else:
+                outcome = 'ok'
+            self.stats['requests'] += 1
+            self.stats['records'] += records
+            if outcome != 'ok':
+                self.stats[outcome] += 1
+        return outcome, delay + self.record_latency * records
+
+    def completion_content(self, user_prompt):
+        """Returns (content, number of records) answering an extraction prompt."""
+        batch = BATCH_PROMPT_PATTERN.search(user_prompt)
+        if batch:
+            records = json.loads(batch.group(1))
+            results = {record_id: fake_medications(text, self.responses) for record_id, text in records.items()}
+            return json.dumps({'results': results}), len(records)
+        single = SINGLE_PROMPT_PATTERN.search(user_prompt)
+        text = single.group(1) if single else user_prompt
+        return json.dumps({'medications': fake_medications(text, self.responses)}), 1
+
+
+class FakeLLMRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        logging.debug(f"Fake LLM server: {format % args}")
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            with self.server._lock:
+                self._send_json(200, dict(self.server.stats))
+        else:
+            self._send_json(404, {'error': {'message': 'Not found'}})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'Not found'}})
+            return
+
+        user_prompt = next((message.get('content', '') for message in reversed(request.get('messages', []))
+                            if message.get('role') == 'user'), '')
+        content, records = self.server.completion_content(user_prompt)
+        outcome, delay = self.server.draw(records)
+        time.sleep(delay)
+
+        if outcome == 'errors':
+            self._send_json(500, {'error': {'message': 'Injected server error', 'type': 'internal_server_error'}})
+            return
+        if outcome == 'rate_limited':
+            self._send_json(429, {'error': {'message': 'Injected rate limit', 'type': 'rate_limit_exceeded'}},
+                            headers={'retry-after': str(self.server.retry_after)})
+            return
+        if outcome == 'malformed':
+            content = content[:len(content) // 2]
+
+        prompt_tokens = sum(len(message.get('content', '')) for message in request.get('messages', [])) // 4
+        completion_tokens = len(content) // 4
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                 'total_tokens': prompt_tokens + completion_tokens}
+        pieces = [content[start:start + STREAM_CHUNK_CHARS] for start in range(0, len(content), STREAM_CHUNK_CHARS)]
+        if request.get('stream'):
+            self._send_stream(request.get('model', ''), pieces, usage)
+            return
+
+        time.sleep(self.server.token_delay * len(pieces))
+        self._send_json(200, {
+            'id': f"chatcmpl-fake-{self.server.stats['requests']}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', ''),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': usage,
+        })
+
+    def _send_stream(self, model, pieces, usage):
+        """Sends the content as server-sent chat.completion.chunk events, one per piece, then [DONE]."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        completion_id = f"chatcmpl-fake-{self.server.stats['requests']}"
+        created = int(time.time())
+
+        def event(delta, finish_reason=None, **extra):
+            chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                     'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}], **extra}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        try:
+            event({'role': 'assistant', 'content': ''})
+            for piece in pieces:
+                time.sleep(self.server.token_delay)
+                event({'content': piece})
+            event({}, finish_reason='stop', x_groq={'usage': usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client stopped reading
+
+
+def start_fake_llm_server(host='127.0.0.1', port=0, **options):
+    """Starts a FakeLLMServer on a background thread and returns it; stop it with shutdown()."""
+    server = FakeLLMServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name='fake-llm-server', daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Groq-compatible chat completions server for benchmarks. "
+                                                 "Point the app at it with LLM_BASE_URL=http://HOST:PORT.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.5, help="Median seconds per request")
+    parser.add_argument('--latency-dist', choices=['fixed', 'uniform', 'lognormal'], default='fixed')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help="Shape of the lognormal latency")
+    parser.add_argument('--record-latency', type=float, default=0.0, help="Extra seconds per batched record")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests failing with 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fraction of requests failing with 429")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="retry-after header of the 429s")
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help="Fraction of responses with broken JSON")
+    parser.add_argument('--responses', help="JSON file mapping input text to a canned medication list")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--token-delay', type=float, default=0.0,
+                        help=f"Seconds to generate each {STREAM_CHUNK_CHARS} characters of content")
+    args = parser.parse_args()
+
+    responses = None
+    if args.responses:
+        with open(args.responses, encoding='utf-8') as f:
+            responses = json.load(f)
+
+    server = FakeLLMServer((args.host, args.port), latency=args.latency, latency_dist=args.latency_dist,
+                           latency_sigma=args.latency_sigma, record_latency=args.record_latency,
+                           error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                           retry_after=args.retry_after, malformed_rate=args.malformed_rate,
+                           responses=responses, seed=args.seed, token_delay=args.token_delay)
+    print(f"Fake LLM server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
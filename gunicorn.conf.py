@@ -0,0 +1,17 @@
+import os
+import multiprocessing
+
+# Run with: gunicorn -c gunicorn.conf.py run:app
+#
+# The app is loaded once in the master before the workers are forked, so the reference data is
+# loaded (and its snapshot mapped) once and shared by all workers; create_app restarts each
+# worker's threads and connections after the fork. The dispatcher's in-flight limits are shared
+# by the workers through Config.WORKER_STATE_FILE.
+os.environ.setdefault('SHARED_ADMISSION', '1')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'  # Requests wait on dispatcher futures and batch responses stream
+threads = int(os.environ.get('WEB_THREADS', 8))
+preload_app = True
+timeout = 180  # Longer than Config.REQUEST_TIMEOUT
@@ -1,16 +1,23 @@
 import pandas as pd
-from app.services.medication_extractor import extract_medications_from_groq
-from app.services.dili_connector import get_dili_risk_from_excel
+from app.services.medication_extractor import extract_medications_from_groq, extract_medications_batch
+from app.services.dili_connector import match_dili_risk
 from app.services.utils import clean_and_split_drug_names
 from config import Config
+from app.services.rate_limiter import RateLimiter
+from app.services.logging_config import setup_logging
+from app.services.local_extractor import (extract_medications_locally, escalation_input, combine_with_escalation,
+                                          get_local_extraction_stats)
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import argparse
+import csv
+import heapq
+import json
 import logging
-import time
+import multiprocessing
+import os
+import zlib
 from fuzzywuzzy import fuzz
 
-# Configure logging
-logging.basicConfig(filename='app.log', level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
-
 def evaluate_extraction(extracted_medications, drug_concat_list):
     """
     Evaluates the medication extraction performance using fuzzy matching.
@@ -54,99 +61,561 @@ def evaluate_extraction(extracted_medications, drug_concat_list):
 
     return true_positives, false_positives, false_negatives
 
-def process_nhanes_data(input_file, output_file):
+def extract_unique_inputs(unique_inputs, concurrency=1, rate_limiter=None, use_cache=None, batch_size=None, mode='llm'):
+    """
+    Extracts medications once for each distinct drug_concat string.
+
+    Args:
+        unique_inputs (iterable): Distinct drug_concat strings.
+        concurrency (int): Maximum number of extraction calls in flight. Above 1, calls are paced
+                           by `rate_limiter` instead of fixed sleeps.
+        rate_limiter (RateLimiter): Limiter shared by all calls (required when concurrency > 1).
+        use_cache (bool): Passed on to extract_medications_from_groq.
+        batch_size (int): If set, extract groups of up to this many inputs with
+                          extract_medications_batch (each group is further split to fit
+                          Config.BATCH_TOKEN_BUDGET).
+        mode (str): 'llm', 'local' or 'hybrid' (see medication_extractor.extract_medications). With
+                    'hybrid', only the drugs that could not be resolved locally are sent to the LLM,
+                    one (deduplicated) request per distinct remainder.
+
+    Returns:
+        dict: drug_concat string -> list of extracted medications (None or [] if nothing was extracted),
+              in the order of `unique_inputs`.
+    """
+    def extract(drug_concat_str):
+        # Without a rate limiter, each API call is preceded by the Config.LLM_CALL_DELAY sleep
+        # in medication_extractor
+        try:
+            return extract_medications_from_groq(drug_concat_str, model=Config.MODEL,
+                                                 use_cache=use_cache, rate_limiter=rate_limiter)
+        except Exception as e:
+            logging.error(f"Error extracting medications from Groq API for input '{drug_concat_str}': {e}", exc_info=True)
+            return []  # Handle API extraction errors gracefully
+
+    def extract_group(group):
+        try:
+            extracted = extract_medications_batch(dict(enumerate(group)), model=Config.MODEL,
+                                                  use_cache=use_cache, rate_limiter=rate_limiter)
+            return [extracted[index] for index in range(len(group))]
+        except Exception as e:
+            logging.error(f"Error extracting medications from Groq API for a batch of {len(group)} inputs: {e}", exc_info=True)
+            return [[] for _ in group]
+
+    unique_inputs = list(unique_inputs)
+    if mode != 'llm':
+        local_extractions = {drug_concat_str: extract_medications_locally(drug_concat_str) for drug_concat_str in unique_inputs}
+        escalations = []
+        if mode == 'hybrid':
+            escalations = list(dict.fromkeys(escalation_input(unresolved)
+                                             for _, unresolved in local_extractions.values() if unresolved))
+        escalated = extract_unique_inputs(escalations, concurrency, rate_limiter, use_cache, batch_size) if escalations else {}
+        return {
+            drug_concat_str: combine_with_escalation(medications, unresolved, escalated.get(escalation_input(unresolved)))
+            for drug_concat_str, (medications, unresolved) in local_extractions.items()
+        }
+
+    if batch_size:
+        tasks = [unique_inputs[start:start + batch_size] for start in range(0, len(unique_inputs), batch_size)]
+        run_task = extract_group
+    else:
+        tasks = unique_inputs
+        run_task = extract
+
+    if concurrency <= 1:
+        results = [run_task(task) for task in tasks]
+    else:
+        # map() yields results in input order, so the output does not depend on completion order
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(run_task, tasks))
+
+    if batch_size:
+        results = [medication_info for group_results in results for medication_info in group_results]
+    return dict(zip(unique_inputs, results))
+
+def resolve_unique_drugs(drug_names):
+    """
+    Looks up DILI risk once for each distinct normalized drug name.
+
+    Args:
+        drug_names (list): Distinct lowercased drug names.
+
+    Returns:
+        dict: drug name -> (DILIrank risk, LiverTox risk, matched reference drug, match score).
+              The risks are strings; the matched drug is None if there is no match.
+    """
+    matches = match_dili_risk([{'normalized_name': name} for name in drug_names])
+    if len(matches) != len(drug_names):  # The lookup failed as a whole
+        return {name: ('Unknown', 'Unknown', None, None) for name in drug_names}
+    return {
+        name: (str(dili_info.get('DILI_Likelihood', 'Unknown')), str(dili_info.get('LiverTox_LikelihoodScore', 'Unknown')),
+               matched_drug, score)
+        for name, (dili_info, matched_drug, score) in zip(drug_names, matches)
+    }
+
+def long_format_rows(df, extractions, risk_by_drug):
+    """
+    Lays out the results of a chunk in long format: one row per (seqn, extracted drug) with the
+    matched reference drug, match score, DILI likelihood and LiverTox score of that drug.
+    Rows without an extraction get a single row with a null drug; unmatched drugs have a null
+    matched drug, score and risks.
+
+    Returns:
+        DataFrame: The long_output.COLUMNS columns.
+    """
+    records = []
+    for drug_concat_str, medication_info in extractions.items():
+        drug_names = dict.fromkeys(medication.get('normalized_name', '').lower() for medication in medication_info or [])
+        if not drug_names:
+            records.append((drug_concat_str, None, None, None, None, None))
+        for name in drug_names:
+            dilirank_risk, livertox_risk, matched_drug, score = risk_by_drug[name]
+            if matched_drug is None:
+                dilirank_risk = livertox_risk = score = None
+            records.append((drug_concat_str, name, matched_drug, score, dilirank_risk, livertox_risk))
+    per_input = pd.DataFrame(records, columns=['drug_concat', 'extracted_drug', 'matched_drug', 'match_score',
+                                               'dili_likelihood', 'livertox_score'])
+    rows = pd.DataFrame({'seqn': df['seqn'], 'drug_concat': df['drug_concat'].map(str)})
+    return rows.merge(per_input, on='drug_concat', how='left').drop(columns='drug_concat')
+
+def process_nhanes_chunk(df, concurrency=1, rate_limiter=None, use_cache=None, batch_size=None, mode='llm',
+                         extractions_file=None, long_writer=None):
+    """
+    Adds the DILIrank_Risk and LiverTox_Risk columns to a DataFrame of NHANES rows.
+
+    NHANES rows repeat heavily, so the work is planned before it is done: every distinct drug_concat
+    string is extracted once, every distinct extracted drug name is looked up once, and the results
+    are broadcast back to the rows with a pandas join.
+
+    Args:
+        df (DataFrame): NHANES rows with a 'drug_concat' column (modified in place).
+        concurrency, rate_limiter, use_cache, batch_size, mode: See extract_unique_inputs.
+        extractions_file (file): Optional text file to which the extraction of every distinct input
+                                 is appended as a JSON line {"drug_concat": ..., "medications": ...}.
+        long_writer (LongFormatWriter): Optional writer that gets the chunk in long format
+                                        (see long_format_rows); requires a 'seqn' column.
+
+    Returns:
+        tuple: (df, (true_positives, false_positives, false_negatives)) for the extraction of these rows.
+    """
+    # Plan: collect the distinct inputs and how many rows share each of them
+    drug_concat = df['drug_concat'].map(str)
+    input_counts = drug_concat.value_counts(sort=False)
+    logging.info(f"Planned {len(input_counts)} extractions for {len(df)} rows")
+
+    extractions = extract_unique_inputs(input_counts.index, concurrency, rate_limiter, use_cache, batch_size, mode)
+    if extractions_file is not None:
+        for drug_concat_str in input_counts.index:
+            extractions_file.write(json.dumps({'drug_concat': drug_concat_str,
+                                               'medications': extractions[drug_concat_str]}) + '\n')
+
+    unique_drugs = sorted({
+        medication.get('normalized_name', '').lower()
+        for medication_info in extractions.values() if medication_info
+        for medication in medication_info
+    })
+    logging.info(f"Resolving DILI risk for {len(unique_drugs)} distinct drugs")
+    risk_by_drug = resolve_unique_drugs(unique_drugs)
+
+    all_tp = 0
+    all_fp = 0
+    all_fn = 0
+
+    plan_rows = []
+    for drug_concat_str, row_count in input_counts.items():
+        medication_info = extractions[drug_concat_str]
+        individual_drugs = clean_and_split_drug_names(drug_concat_str)
+
+        if medication_info:
+            # Evaluate extraction performance, once for every row sharing this input
+            tp, fp, fn = evaluate_extraction(medication_info, individual_drugs)
+            all_tp += tp * row_count
+            all_fp += fp * row_count
+            all_fn += fn * row_count
+
+            risks = [risk_by_drug[medication.get('normalized_name', '').lower()] for medication in medication_info]
+            dilirank_risks = [dilirank_risk for dilirank_risk, _, _, _ in risks]
+            livertox_risks = [livertox_risk for _, livertox_risk, _, _ in risks]
+        else:
+            logging.warning("No medication information extracted for %d row(s): %s", row_count, drug_concat_str)
+            dilirank_risks = ['Unknown']
+            livertox_risks = ['Unknown']
+
+        # Combine risks for multiple drugs (if any)
+        plan_rows.append((drug_concat_str, ', '.join(dilirank_risks), ', '.join(livertox_risks)))
+
+    # Broadcast the per-input results back to every row
+    plan = pd.DataFrame(plan_rows, columns=['drug_concat', 'DILIrank_Risk', 'LiverTox_Risk']).set_index('drug_concat')
+    df['DILIrank_Risk'] = drug_concat.map(plan['DILIrank_Risk'])
+    df['LiverTox_Risk'] = drug_concat.map(plan['LiverTox_Risk'])
+    if long_writer is not None:
+        long_writer.write(long_format_rows(df, extractions, risk_by_drug))
+    return df, (all_tp, all_fp, all_fn)
+
+def load_checkpoint(checkpoint_file):
+    """Returns the checkpoint saved by an earlier run, or None if there is none."""
+    try:
+        with open(checkpoint_file) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_checkpoint(checkpoint_file, checkpoint):
+    """Durably replaces a checkpoint or metrics file (write to a temporary file, fsync, rename)."""
+    temp_file = checkpoint_file + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, checkpoint_file)
+
+def open_output(output_file, committed_bytes):
+    """Opens the output CSV for appending, dropping anything written after the last checkpoint."""
+    output = open(output_file, 'a+', newline='')
+    output.truncate(committed_bytes)
+    output.seek(0, os.SEEK_END)
+    return output
+
+def log_extraction_metrics(all_tp, all_fp, all_fn):
+    """Logs the overall precision, recall, and F1-score."""
+    precision = all_tp / (all_tp + all_fp) if (all_tp + all_fp) > 0 else 0
+    recall = all_tp / (all_tp + all_fn) if (all_tp + all_fn) > 0 else 0
+    f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+
+    logging.info(f"Overall Medication Extraction Performance:")
+    logging.info(f"  Precision: {precision:.2f}")
+    logging.info(f"  Recall: {recall:.2f}")
+    logging.info(f"  F1-score: {f1:.2f}")
+
+def parse_shard(value):
+    """Parses a shard spec 'i/N' into (i, N)."""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like i/N, got {value!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Shard index must be in 0..N-1, got {value!r}")
+    return index, count
+
+def shard_path(path, index, count):
+    """Returns the per-shard variant of a file path, e.g. out.csv -> out.shard-0-of-4.csv."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{index}-of-{count}{ext}"
+
+def shard_mask(seqns, index, count):
+    """
+    Selects the rows of shard `index` of `count`. Integer seqns go to shard seqn % count, anything
+    else by a CRC32 of its text, so a row always lands in the same shard whatever the chunking.
+    """
+    numeric = pd.to_numeric(seqns, errors='coerce')
+    is_integer = numeric.notna() & (numeric == numeric.round())
+    shards = pd.Series(0, index=seqns.index, dtype='int64')
+    shards[is_integer] = numeric[is_integer].astype('int64') % count
+    shards[~is_integer] = seqns[~is_integer].map(lambda seqn: zlib.crc32(str(seqn).encode('utf-8')) % count)
+    return shards == index
+
+def process_nhanes_data(input_file, output_file, concurrency=1, requests_per_minute=None, tokens_per_minute=None,
+                        use_cache=None, chunk_size=None, resume=False, batch_size=None, mode='llm',
+                        extractions_file=None, shard=None, long_output=None):
     """
     Processes the NHANES data in the input CSV file, extracts medications from the 'drug_concat' column,
     assesses DILI risk, and adds the results to new columns in the output CSV file.
 
+    With `chunk_size`, the input is streamed in chunks of that many rows and each finished chunk is
+    appended to the output file, followed by a checkpoint (`<output_file>.checkpoint.json`) holding the
+    number of input rows consumed, the committed size of the output file and the running TP/FP/FN
+    totals. With `resume`, a later run truncates the output back to the last checkpoint, skips the
+    consumed input rows and carries the totals on, so the final metrics cover the whole file. The
+    output file is not touched before the first chunk has been processed.
+
     Args:
         input_file (str): Path to the input CSV file.
         output_file (str): Path to the output CSV file.
+        concurrency (int): Maximum number of extraction calls in flight (default 1: serial, with a
+                           Config.LLM_CALL_DELAY before each API call).
+        requests_per_minute (int): API request quota for concurrent runs (default: Config.LLM_REQUESTS_PER_MINUTE).
+        tokens_per_minute (int): API token quota for concurrent runs (default: Config.LLM_TOKENS_PER_MINUTE; 0: no token limit).
+        use_cache (bool): Whether to use the extraction cache (default: Config.EXTRACTION_CACHE_ENABLED).
+        chunk_size (int): Rows per chunk for streaming, checkpointed runs (default: whole file at once).
+        resume (bool): Continue from the checkpoint of an interrupted streaming run.
+        batch_size (int): Extract up to this many distinct inputs per batched API request.
+        mode (str): Extractor to use: 'llm', 'local' or 'hybrid' (see extract_unique_inputs).
+        extractions_file (str): Also save the extraction of every distinct input to this JSON lines
+                                file, for offline evaluation with evaluate.py (appended to on resume).
+        shard (tuple): (index, count) to process only the rows of one shard (see shard_mask). The
+                       shard's rows and TP/FP/FN totals are also saved to `<output_file>.metrics.json`
+                       for merge_shards.
+        long_output (str): Also write the results in long format (one row per seqn and extracted
+                           drug) to this directory of compressed Parquet files, one per chunk, and
+                           a per-drug aggregate to `<long_output>.by_drug.parquet` (requires pyarrow
+                           and a 'seqn' column).
+
+    Returns:
+        dict: The row count and TP/FP/FN totals, or None if processing failed.
     """
+    checkpoint_file = output_file + '.checkpoint.json'
     try:
+        rate_limiter = None
+        if concurrency > 1:
+            rate_limiter = RateLimiter(requests_per_minute or Config.LLM_REQUESTS_PER_MINUTE,
+                                       Config.LLM_TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute)
+
+        checkpoint = None
+        if resume:
+            if not chunk_size:
+                logging.error("Error: resuming requires a streaming run (chunk_size).")
+                return
+            checkpoint = load_checkpoint(checkpoint_file)
+            if checkpoint is None or checkpoint['input_file'] != input_file or 'input_rows' not in checkpoint:
+                logging.warning(f"No checkpoint for {input_file} found in {checkpoint_file}; starting from the beginning.")
+                checkpoint = None
+        if checkpoint is None:
+            checkpoint = {'input_file': input_file, 'input_rows': 0, 'output_bytes': 0, 'long_parts': 0,
+                          'rows': 0, 'tp': 0, 'fp': 0, 'fn': 0}
+        else:
+            logging.info(f"Resuming after {checkpoint['input_rows']} input rows ({checkpoint['rows']} processed)")
+        skip_rows = checkpoint['input_rows']
+
         logging.info(f"Loading NHANES data from: {input_file}")
-        df = pd.read_csv(input_file)
-        logging.info(f"Successfully loaded NHANES data. Number of rows: {len(df)}")
-
-        if 'drug_concat' not in df.columns:
-            logging.error("Error: 'drug_concat' column not found in the input CSV.")
-            return
-
-        # Create new columns for DILI and LiverTox risk
-        df['DILIrank_Risk'] = ''
-        df['LiverTox_Risk'] = ''
-
-        all_tp = 0
-        all_fp = 0
-        all_fn = 0
-
-        processed_rows = 0
-        for index, row in df.iterrows():
-            drug_concat_str = str(row['drug_concat'])
-            individual_drugs = clean_and_split_drug_names(drug_concat_str)
-            logging.info(f"Processing row {index + 1}: {drug_concat_str} -> {individual_drugs}")
-
-            dilirank_risks = []
-            livertox_risks = []
-
-            # Extract medications using Groq API
-            try:
-                medication_info = extract_medications_from_groq(drug_concat_str, model=Config.MODEL)
-                time.sleep(2)  # Rate limiting: 2-second delay between API calls
-            except Exception as e:
-                logging.error(f"Error extracting medications from Groq API for row {index + 1}: {e}", exc_info=True)
-                medication_info = []  # Handle API extraction errors gracefully
-
-            if medication_info:
-                # Evaluate extraction performance
-                tp, fp, fn = evaluate_extraction(medication_info, individual_drugs)
-                all_tp += tp
-                all_fp += fp
-                all_fn += fn
-
-                for medication in medication_info:
-                    # Get DILI risk information from the combined Excel file
-                    normalized_drug_name = medication.get('normalized_name', '').lower()
-                    dili_risk_data = get_dili_risk_from_excel([{'normalized_name': normalized_drug_name}])
-
-                    if dili_risk_data:
-                        dili_info = dili_risk_data[0]
-                        dilirank_risks.append(str(dili_info.get('DILI_Likelihood', 'Unknown')))
-                        livertox_risks.append(str(dili_info.get('LiverTox_LikelihoodScore', 'Unknown')))
-                    else:
-                        dilirank_risks.append('Unknown')
-                        livertox_risks.append('Unknown')
-            else:
-                logging.warning(f"No medication information extracted for row: {index + 1}")
-                dilirank_risks.append('Unknown')
-                livertox_risks.append('Unknown')
-
-            # Combine risks for multiple drugs (if any)
-            df.loc[index, 'DILIrank_Risk'] = ', '.join(dilirank_risks)
-            df.loc[index, 'LiverTox_Risk'] = ', '.join(livertox_risks)
-
-            processed_rows += 1
-            if processed_rows % 100 == 0:
-                logging.info(f"Processed {processed_rows} rows out of {len(df)}")
-
-        # Calculate overall precision, recall, and F1-score
-        precision = all_tp / (all_tp + all_fp) if (all_tp + all_fp) > 0 else 0
-        recall = all_tp / (all_tp + all_fn) if (all_tp + all_fn) > 0 else 0
-        f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
-
-        logging.info(f"Overall Medication Extraction Performance:")
-        logging.info(f"  Precision: {precision:.2f}")
-        logging.info(f"  Recall: {recall:.2f}")
-        logging.info(f"  F1-score: {f1:.2f}")
-
-        logging.info(f"Saving results to: {output_file}")
-        df.to_csv(output_file, index=False)
+        if chunk_size:
+            chunks = pd.read_csv(input_file, chunksize=chunk_size)
+        else:
+            chunks = [pd.read_csv(input_file)]
+
+        saved_extractions = open(extractions_file, 'a' if resume else 'w') if extractions_file else None
+        long_writer = None
+        if long_output:
+            from app.services.long_output import LongFormatWriter
+            long_writer = LongFormatWriter(long_output, checkpoint.get('long_parts', 0))
+        # Opened (and cut back to the last checkpoint) once there is something to write, so a run
+        # that fails early leaves an existing output alone
+        output = None
+        try:
+            for chunk in chunks:
+                if 'drug_concat' not in chunk.columns:
+                    logging.error("Error: 'drug_concat' column not found in the input CSV.")
+                    return
+                if (shard or long_writer) and 'seqn' not in chunk.columns:
+                    logging.error("Error: sharding and long-format output require a 'seqn' column in the input CSV.")
+                    return
+                checkpoint['input_rows'] += len(chunk)
+                if skip_rows:
+                    # Rows consumed before the checkpoint
+                    skipped = min(skip_rows, len(chunk))
+                    chunk = chunk.iloc[skipped:]
+                    skip_rows -= skipped
+                if shard:
+                    chunk = chunk[shard_mask(chunk['seqn'], *shard)]
+                if chunk.empty:
+                    continue
+                chunk = chunk.copy()
+
+                chunk, (tp, fp, fn) = process_nhanes_chunk(chunk, concurrency, rate_limiter, use_cache, batch_size, mode,
+                                                           saved_extractions, long_writer)
+                if saved_extractions is not None:
+                    saved_extractions.flush()
+                if output is None:
+                    output = open_output(output_file, checkpoint['output_bytes'])
+                chunk.to_csv(output, header=output.tell() == 0, index=False)
+                output.flush()
+
+                checkpoint['rows'] += len(chunk)
+                checkpoint['tp'] += tp
+                checkpoint['fp'] += fp
+                checkpoint['fn'] += fn
+                logging.info(f"Processed {checkpoint['rows']} rows")
+                if chunk_size:
+                    os.fsync(output.fileno())
+                    checkpoint['output_bytes'] = output.tell()
+                    if long_writer is not None:
+                        checkpoint['long_parts'] = long_writer.parts
+                    save_checkpoint(checkpoint_file, checkpoint)
+            if output is None:
+                # Nothing left to process (or an empty shard): still leave a consistent output file
+                output = open_output(output_file, checkpoint['output_bytes'])
+        finally:
+            if output is not None:
+                output.close()
+
+        if saved_extractions is not None:
+            saved_extractions.close()
+        if long_writer is not None:
+            long_writer.write_aggregate()
+        log_extraction_metrics(checkpoint['tp'], checkpoint['fp'], checkpoint['fn'])
+        if mode != 'llm':
+            local_stats = get_local_extraction_stats()
+            logging.info(f"  Drugs resolved locally: {local_stats['local_tokens']} of {local_stats['tokens']} "
+                         f"({local_stats['local_fraction']:.1%})")
+        totals = {key: checkpoint[key] for key in ('rows', 'tp', 'fp', 'fn')}
+        if shard:
+            save_checkpoint(output_file + '.metrics.json', {'shard': list(shard), **totals})
+        logging.info(f"Results saved to: {output_file}")
         logging.info("Processing complete.")
+        return totals
 
     except FileNotFoundError:
         logging.error(f"Error: Input file not found: {input_file}")
     except Exception as e:
         logging.error(f"An error occurred during processing: {e}", exc_info=True)
 
+def _seqn_key(seqn):
+    try:
+        return (0, float(seqn), '')
+    except ValueError:
+        return (1, 0.0, seqn)
+
+def merge_shards(output_file, count, extractions_file=None, long_output=None):
+    """
+    Merges the outputs of a sharded run into `output_file` and combines the shards' metrics.
+
+    The shard CSVs are merged row by row in seqn order (each shard is in input order, so the
+    merge is fully sorted when the input is sorted by seqn) without loading them into memory.
+    The TP/FP/FN totals of the metrics partials are summed, logged and saved to
+    `<output_file>.metrics.json`. With `extractions_file`, the shards' saved extractions are
+    concatenated into it; with `long_output`, the shards' long-format outputs are combined into it
+    and aggregated per drug.
+
+    Args:
+        output_file (str): The output path the shards were derived from (see shard_path).
+        count (int): Number of shards.
+        extractions_file (str): Optional extractions path the shards were derived from.
+        long_output (str): Optional long-format output directory the shards were derived from.
+
+    Returns:
+        dict: The combined row count and TP/FP/FN totals, or None if a shard is missing or unfinished.
+    """
+    totals = {'rows': 0, 'tp': 0, 'fp': 0, 'fn': 0}
+    for index in range(count):
+        metrics = load_checkpoint(shard_path(output_file, index, count) + '.metrics.json')
+        if metrics is None:
+            logging.error(f"Shard {index}/{count} has not finished: no metrics for {shard_path(output_file, index, count)}")
+            return None
+        for key in totals:
+            totals[key] += metrics[key]
+
+    shard_files = [open(shard_path(output_file, index, count), newline='') for index in range(count)]
+    try:
+        readers = [csv.reader(shard_file) for shard_file in shard_files]
+        headers = [next(reader, None) for reader in readers]
+        header = next((header for header in headers if header), None)
+        if any(shard_header and shard_header != header for shard_header in headers):
+            logging.error("Cannot merge shards with different columns")
+            return None
+        with open(output_file, 'w', newline='') as output:
+            if header:
+                seqn_column = header.index('seqn')
+                writer = csv.writer(output, lineterminator=os.linesep)
+                writer.writerow(header)
+                writer.writerows(heapq.merge(*readers, key=lambda row: _seqn_key(row[seqn_column])))
+    finally:
+        for shard_file in shard_files:
+            shard_file.close()
+
+    if extractions_file:
+        with open(extractions_file, 'w') as merged:
+            for index in range(count):
+                with open(shard_path(extractions_file, index, count)) as partial:
+                    merged.writelines(partial)
+    if long_output:
+        from app.services.long_output import merge_long_outputs
+        merge_long_outputs([shard_path(long_output, index, count) for index in range(count)], long_output)
+
+    save_checkpoint(output_file + '.metrics.json', {'shards': count, **totals})
+    logging.info(f"Merged {count} shards ({totals['rows']} rows) into {output_file}")
+    log_extraction_metrics(totals['tp'], totals['fp'], totals['fn'])
+    return totals
+
+def run_sharded(input_file, output_file, processes, requests_per_minute=None, tokens_per_minute=None,
+                extractions_file=None, long_output=None, **options):
+    """
+    Processes the input in `processes` shards on local worker processes, then merges them.
+
+    Each process handles shard i/processes exactly as `--shard i/N` would (so an interrupted run
+    can be resumed per shard) with an equal share of the API quota.
+
+    Args:
+        input_file, output_file, extractions_file, long_output: As for process_nhanes_data; shard
+                                                                outputs are derived from them with shard_path.
+        processes (int): Number of shards and worker processes.
+        requests_per_minute, tokens_per_minute (int): API quota for the whole run.
+        **options: Passed on to process_nhanes_data.
+
+    Returns:
+        dict: The combined totals (see merge_shards), or None if a shard failed.
+    """
+    requests_per_minute = max(1, (requests_per_minute or Config.LLM_REQUESTS_PER_MINUTE) // processes)
+    if tokens_per_minute is None:
+        tokens_per_minute = Config.LLM_TOKENS_PER_MINUTE
+    if tokens_per_minute:  # 0 means no token limit
+        tokens_per_minute = max(1, tokens_per_minute // processes)
+    # Spawned (not forked) workers start without the parent's threads, locks and open connections
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=setup_logging) as executor:
+        futures = [
+            executor.submit(process_nhanes_data, input_file, shard_path(output_file, index, processes),
+                            requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute,
+                            extractions_file=shard_path(extractions_file, index, processes) if extractions_file else None,
+                            long_output=shard_path(long_output, index, processes) if long_output else None,
+                            shard=(index, processes), **options)
+            for index in range(processes)
+        ]
+        results = [future.result() for future in futures]
+    if any(result is None for result in results):
+        logging.error(f"{results.count(None)} of {processes} shards failed; fix the cause and rerun with --resume")
+        return None
+    return merge_shards(output_file, processes, extractions_file, long_output)
+
 if __name__ == "__main__":
-    process_nhanes_data(Config.NHANES_INPUT_FILE, Config.OUTPUT_FILE)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Extract medications from NHANES data and add DILI risk columns.")
+    parser.add_argument('--input', default=Config.NHANES_INPUT_FILE, help="Input CSV with a drug_concat column")
+    parser.add_argument('--output', default=Config.OUTPUT_FILE, help="Output CSV")
+    parser.add_argument('--concurrency', type=int, default=Config.NHANES_CONCURRENCY,
+                        help="Extraction calls in flight; above 1 calls are paced by --rpm/--tpm")
+    parser.add_argument('--rpm', type=int, default=Config.LLM_REQUESTS_PER_MINUTE, help="API requests per minute")
+    parser.add_argument('--tpm', type=int, default=Config.LLM_TOKENS_PER_MINUTE, help="API tokens per minute (0: no token limit)")
+    parser.add_argument('--no-cache', action='store_true', help="Bypass the extraction cache")
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help="Stream the input in chunks of this many rows, checkpointing after each chunk")
+    parser.add_argument('--resume', action='store_true', help="Continue an interrupted --chunk-size run")
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help="Pack up to this many inputs into each API request")
+    parser.add_argument('--extractor', choices=['llm', 'local', 'hybrid'], default=Config.EXTRACTION_MODE,
+                        help="llm: send every input to the LLM; local: resolve drug lists against the reference "
+                             "data only; hybrid: resolve locally and send only the rest to the LLM")
+    parser.add_argument('--save-extractions', default=None,
+                        help="Also save every extraction to this JSON lines file (input for evaluate.py)")
+    parser.add_argument('--long-output', type=os.path.normpath, default=None,
+                        help="Also write one row per seqn and extracted drug to this directory of compressed "
+                             "Parquet files, plus a per-drug aggregate <dir>.by_drug.parquet")
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                        help="Process only shard i/N (rows partitioned by seqn), writing a per-shard output "
+                             "and metrics partial; combine the shards with the merge command")
+    parser.add_argument('--processes', type=int, default=None,
+                        help="Run this many shards on local worker processes and merge them")
+    commands = parser.add_subparsers(dest='command')
+    merge_parser = commands.add_parser('merge', help="Merge the outputs and metrics of a sharded run")
+    merge_parser.add_argument('--shards', type=int, required=True, help="Number of shards (N)")
+    merge_parser.add_argument('--output', default=argparse.SUPPRESS, help="Output CSV the shards were run with")
+    merge_parser.add_argument('--save-extractions', default=argparse.SUPPRESS,
+                              help="Extractions file the shards were run with")
+    merge_parser.add_argument('--long-output', type=os.path.normpath, default=argparse.SUPPRESS,
+                              help="Long-format output directory the shards were run with")
+    args = parser.parse_args()
+    setup_logging()
+
+    options = dict(concurrency=args.concurrency, use_cache=False if args.no_cache else None,
+                   chunk_size=args.chunk_size, resume=args.resume, batch_size=args.batch_size, mode=args.extractor)
+    if args.command == 'merge':
+        merge_shards(args.output, args.shards, args.save_extractions, args.long_output)
+    elif args.processes:
+        run_sharded(args.input, args.output, args.processes, requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                    extractions_file=args.save_extractions, long_output=args.long_output, **options)
+    elif args.shard:
+        index, count = args.shard
+        process_nhanes_data(args.input, shard_path(args.output, index, count), requests_per_minute=args.rpm,
+                            tokens_per_minute=args.tpm, shard=args.shard,
+                            extractions_file=shard_path(args.save_extractions, index, count) if args.save_extractions else None,
+                            long_output=shard_path(args.long_output, index, count) if args.long_output else None,
+                            **options)
+    else:
+        process_nhanes_data(args.input, args.output, requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                            extractions_file=args.save_extractions, long_output=args.long_output, **options)
\ No newline at end of file
@@ -0,0 +1,27 @@
+import pandas as pd
+
+from process_nhanes import long_format_rows
+
+
+def test_unmatched_drug_has_no_match_score_or_risks():
+    df = pd.DataFrame({'seqn': [1, 2, 3], 'drug_concat': ['METFORMIN', 'ZZQQXX', 'NONE']})
+    extractions = {
+        'METFORMIN': [{'normalized_name': 'metformin'}],
+        'ZZQQXX': [{'normalized_name': 'zzqqxx'}],
+        'NONE': None,
+    }
+    risk_by_drug = {
+        'metformin': ('vLess-DILI-Concern', 'B', 'metformin', 100),
+        # A score without a matched drug must not reach the output
+        'zzqqxx': ('Unknown - no match', 'Unknown - no match', None, 70),
+    }
+
+    rows = long_format_rows(df, extractions, risk_by_drug).set_index('seqn')
+
+    assert rows.loc[1, 'matched_drug'] == 'metformin'
+    assert rows.loc[1, 'match_score'] == 100
+    assert rows.loc[1, 'dili_likelihood'] == 'vLess-DILI-Concern'
+    unmatched = rows.loc[2]
+    assert unmatched['extracted_drug'] == 'zzqqxx'
+    assert unmatched[['matched_drug', 'match_score', 'dili_likelihood', 'livertox_score']].isna().all()
+    assert rows.loc[3].isna().all()